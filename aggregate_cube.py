@@ -0,0 +1,104 @@
+"""Pre-aggregated cube of sufficient statistics over the dashboard dimensions"""
+import numpy as np
+import pandas as pd
+
+from filter_index import is_unfiltered
+
+CATEGORY_DIMENSIONS = ['customer_segment', 'channel', 'promo_type', 'product_category', 'customer_status']
+CUBE_DIMENSIONS = CATEGORY_DIMENSIONS + ['income_bucket', 'promo_exposed']
+MEASURES = ['count', 'purchase_sum', 'basket_sum', 'basket_sq_sum']
+
+# Incomes are bucketed to this width (£); the income slider steps in whole buckets
+INCOME_BUCKET_WIDTH = 100
+
+
+def income_buckets(income, width=INCOME_BUCKET_WIDTH):
+    """Bucket number for each income value"""
+    return np.floor_divide(np.asarray(income, dtype=np.float64), width).astype(np.int32)
+
+
+def income_edges(income_range, width=INCOME_BUCKET_WIDTH):
+    """Snap an income range outward to bucket edges, as the half-open range [low, high) every backend filters on"""
+    low, high = income_range
+    return float(np.floor(low / width) * width), float(np.ceil(high / width) * width)
+
+
+def add_rates(stats):
+    """Derive response rate, average basket size and basket std from the summed measures"""
+    stats = stats.copy()
+    count = stats['count']
+    stats['response_rate'] = stats['purchase_sum'] / count
+    stats['avg_basket_size'] = stats['basket_sum'] / count
+    variance = (stats['basket_sq_sum'] - count * stats['avg_basket_size'] ** 2) / (count - 1)
+    stats['basket_std'] = np.sqrt(variance.clip(lower=0))
+    return stats
+
+
+class AggregateCube:
+    """Count, purchase and basket sums for every observed combination of the cube dimensions"""
+    
+    def __init__(self, cells):
+        self.cells = cells
+    
+    @classmethod
+    def from_frame(cls, df):
+        """Aggregate row-level data (with ``customer_segment`` assigned) into cells"""
+        basket = df['basket_size'].to_numpy(dtype=np.float64)
+        rows = pd.DataFrame({dim: df[dim].values for dim in CATEGORY_DIMENSIONS + ['promo_exposed']})
+        rows['income_bucket'] = income_buckets(df['income'])
+        rows['count'] = np.ones(len(df), dtype=np.int64)
+        rows['purchase_sum'] = df['purchase_made'].to_numpy(dtype=np.int64)
+        rows['basket_sum'] = basket
+        rows['basket_sq_sum'] = basket * basket
+        cells = rows.groupby(CUBE_DIMENSIONS, observed=True, sort=False)[MEASURES].sum().reset_index()
+        return cls(cells)
+    
+    @classmethod
+    def combine(cls, cubes):
+        """Merge cubes built from disjoint row sets (chunks, partitions or appended drops)"""
+        # Chunks may carry different category sets; recode each onto the sorted union before
+        # regrouping (only the small category lists are compared, never the cell values)
+        dtypes = {dim: pd.CategoricalDtype(sorted(set().union(*(cube.cells[dim].cat.categories for cube in cubes))))
+                  for dim in CATEGORY_DIMENSIONS}
+        cells = pd.concat([cube.cells.astype(dtypes) for cube in cubes], ignore_index=True)
+        cells = cells.groupby(CUBE_DIMENSIONS, observed=True, sort=False)[MEASURES].sum().reset_index()
+        return cls(cells)
+    
+    def values(self, dim):
+        """Distinct observed values of a dimension"""
+        return sorted(self.cells[dim].unique().tolist())
+    
+    def income_bounds(self):
+        """Lowest and highest income bucket edges covered by the cube"""
+        buckets = self.cells['income_bucket']
+        return int(buckets.min()) * INCOME_BUCKET_WIDTH, int(buckets.max()) * INCOME_BUCKET_WIDTH
+    
+    def _mask(self, where=None, income_range=None):
+        mask = np.ones(len(self.cells), dtype=bool)
+        for dim, selection in (where or {}).items():
+            if not is_unfiltered(selection):
+                values = selection if isinstance(selection, list) else [selection]
+                mask &= self.cells[dim].isin(values).to_numpy()
+        if income_range is not None:
+            buckets = self.cells['income_bucket'].to_numpy()
+            low, high = (edge // INCOME_BUCKET_WIDTH for edge in income_edges(income_range))
+            mask &= (buckets >= low) & (buckets < high)
+        return mask
+    
+    def rollup(self, by, where=None, income_range=None):
+        """Sum the measures over the cells matching the filters, grouped by ``by``"""
+        cells = self.cells[self._mask(where, income_range)]
+        return cells.groupby(by, observed=True)[MEASURES].sum().reset_index()
+    
+    def totals(self, where=None, income_range=None):
+        """Sum of the measures over the cells matching the filters"""
+        cells = self.cells[self._mask(where, income_range)]
+        totals = cells[MEASURES].sum()
+        totals['exposed_count'] = cells.loc[cells['promo_exposed'] == 1, 'count'].sum()
+        return totals
+    
+    def breakdown(self, by, where=None, income_range=None):
+        """Group means named like the row-level columns they summarise"""
+        stats = add_rates(self.rollup(by, where, income_range))
+        return stats[by + ['count']].assign(purchase_made=stats['response_rate'],
+                                           basket_size=stats['avg_basket_size'])
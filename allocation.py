@@ -0,0 +1,151 @@
+"""Budget-constrained allocation of promo contacts across segment, category, channel and promo type
+
+Audiences are (customer_segment, product_category) groups; each customer can
+be contacted at most once, through one (channel, promo_type) tactic. The
+linear relaxation of this multiple-choice knapsack is solved exactly: per
+audience, only tactics on the upper convex hull of (cost, uplift) can be
+optimal, and the hull's incremental moves are filled greedily by incremental
+purchases per pound. The moves depend only on the data and filters, so moving
+the budget re-solves with one sorted cumulative sum.
+"""
+import numpy as np
+import pandas as pd
+
+from config import CHANNEL_COSTS, DEFAULT_CONTACT_COST, PROMO_COSTS
+
+AUDIENCE = ['customer_segment', 'product_category']
+TACTIC = ['channel', 'promo_type']
+ALLOCATION_DIMENSIONS = AUDIENCE + TACTIC
+
+# Pseudo-count pulling sparse cells towards their segment's uplift (empirical Bayes shrinkage)
+PRIOR_STRENGTH = 50
+
+
+def _uplift_parts(stats, by):
+    """Treated / control counts and purchases per group, from cube roll-up rows"""
+    treated = stats['promo_exposed'] == 1
+    parts = pd.DataFrame({
+        'n_treated': stats['count'].where(treated, 0),
+        'y_treated': stats['purchase_sum'].where(treated, 0),
+        'n_control': stats['count'].where(~treated, 0),
+        'y_control': stats['purchase_sum'].where(~treated, 0),
+    })
+    for dim in by:
+        parts[dim] = stats[dim].astype(str).to_numpy()
+    return parts.groupby(by, sort=True).sum().reset_index()
+
+
+def _raw_uplift(parts):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (parts['y_treated'] / parts['n_treated'] - parts['y_control'] / parts['n_control']).to_numpy()
+
+
+def cell_uplift(cube, where=None, income_range=None, prior_strength=PRIOR_STRENGTH):
+    """Uplift per contact for every audience x tactic cell, shrunk towards the segment uplift
+    
+    A cell's weight is its effective sample size n_t * n_c / (n_t + n_c),
+    so cells missing a treated or control group fall back to the segment.
+    ``audience`` is the number of customers in the cell's audience group.
+    """
+    stats = cube.rollup(ALLOCATION_DIMENSIONS + ['promo_exposed'], where, income_range)
+    cells = _uplift_parts(stats, ALLOCATION_DIMENSIONS)
+    segments = _uplift_parts(stats, ['customer_segment'])
+    segment_uplift = pd.Series(np.nan_to_num(_raw_uplift(segments)), index=segments['customer_segment'])
+    
+    n_t, n_c = cells['n_treated'].to_numpy(float), cells['n_control'].to_numpy(float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weight = np.where((n_t > 0) & (n_c > 0), n_t * n_c / (n_t + n_c), 0.0)
+    raw = np.nan_to_num(_raw_uplift(cells))
+    prior = segment_uplift.reindex(cells['customer_segment']).to_numpy()
+    cells['raw_uplift'] = np.where(weight > 0, raw, np.nan)
+    cells['uplift'] = (weight * raw + prior_strength * prior) / (weight + prior_strength)
+    cells['audience'] = cells.groupby(AUDIENCE)[['n_treated', 'n_control']].transform('sum').sum(axis=1)
+    return cells
+
+
+def contact_costs(cells, channel_costs=CHANNEL_COSTS, promo_costs=PROMO_COSTS):
+    """Cost per contact for each cell's tactic"""
+    channel = cells['channel'].map(channel_costs).fillna(DEFAULT_CONTACT_COST / 2)
+    promo = cells['promo_type'].map(promo_costs).fillna(DEFAULT_CONTACT_COST / 2)
+    return (channel + promo).to_numpy(float)
+
+
+def _upper_hull(costs, gains):
+    """Indices of the tactics on the upper concave hull from (0, 0), in increasing cost"""
+    hull = [(0.0, 0.0, -1)]
+    for i in np.lexsort((-gains, costs)):
+        cost, gain = costs[i], gains[i]
+        if gain <= hull[-1][1]:
+            # Costs at least as much as the last hull point for no more uplift
+            continue
+        while len(hull) >= 2:
+            (c0, g0, _), (c1, g1, _) = hull[-2], hull[-1]
+            if (g1 - g0) * (cost - c1) > (gain - g1) * (c1 - c0):
+                break
+            hull.pop()
+        hull.append((cost, gain, i))
+    return [i for _, _, i in hull]
+
+
+def allocation_moves(cells, costs=None):
+    """Incremental hull moves per audience, each with its total cost, gain and gain per pound"""
+    costs = contact_costs(cells) if costs is None else costs
+    gains = cells['uplift'].to_numpy(float)
+    audience = cells['audience'].to_numpy(float)
+    moves = []
+    for _, positions in cells.groupby(AUDIENCE, sort=False).indices.items():
+        hull = _upper_hull(costs[positions], gains[positions])
+        for step, (before, after) in enumerate(zip(hull[:-1], hull[1:])):
+            source = positions[before] if before >= 0 else -1
+            target = positions[after]
+            delta_cost = costs[target] - (costs[source] if source >= 0 else 0.0)
+            delta_gain = gains[target] - (gains[source] if source >= 0 else 0.0)
+            moves.append((source, target, step, delta_cost * audience[target], delta_gain * audience[target],
+                          delta_gain / delta_cost))
+    moves = pd.DataFrame(moves, columns=['source', 'target', 'step', 'cost', 'gain', 'gain_per_pound'])
+    # Typed even when empty (no tactic with positive uplift), so allocate() needs no special case
+    return moves.astype({'source': np.int64, 'target': np.int64, 'step': np.int64, 'cost': np.float64,
+                         'gain': np.float64, 'gain_per_pound': np.float64})
+
+
+def max_useful_budget(moves):
+    """Spend at which every audience sits at its best tactic; more budget buys nothing"""
+    return float(moves['cost'].sum())
+
+
+def allocate(cells, moves, budget):
+    """Customers per cell for a budget, maximising expected incremental purchases
+    
+    The returned frame has one row per funded cell with its contacts, spend
+    and expected incremental purchases, largest gain first.
+    """
+    # Hull slopes fall within each audience, so a global sort keeps every audience's moves in order
+    order = np.lexsort((moves['step'].to_numpy(), -moves['gain_per_pound'].to_numpy()))
+    cost = moves['cost'].to_numpy()[order]
+    spent_before = np.concatenate([[0.0], np.cumsum(cost)[:-1]])
+    fraction = np.clip((budget - spent_before) / cost, 0.0, 1.0)
+    
+    # A move shifts that share of its audience from the source tactic (or no contact) to the target
+    audience = cells['audience'].to_numpy(float)
+    contacts = np.zeros(len(cells))
+    source, target = moves['source'].to_numpy()[order], moves['target'].to_numpy()[order]
+    shifted = fraction * audience[target]
+    np.add.at(contacts, target, shifted)
+    has_source = source >= 0
+    np.add.at(contacts, source[has_source], -shifted[has_source])
+    
+    costs = contact_costs(cells)
+    plan = cells[ALLOCATION_DIMENSIONS + ['uplift', 'raw_uplift', 'audience']].assign(
+        customers=np.floor(contacts + 1e-9).astype(np.int64))
+    plan = plan[plan['customers'] > 0]
+    plan = plan.assign(cost_per_contact=costs[plan.index],
+                       spend=plan['customers'] * costs[plan.index],
+                       incremental_purchases=plan['customers'] * plan['uplift'])
+    return plan.sort_values('incremental_purchases', ascending=False, ignore_index=True)
+
+
+def summarise_plan(plan, by):
+    """Spend, contacts and expected incremental purchases of a plan, grouped by ``by``"""
+    totals = plan.groupby(by, sort=False)[['customers', 'spend', 'incremental_purchases']].sum()
+    totals['uplift_per_contact'] = totals['incremental_purchases'] / totals['customers']
+    return totals.sort_values('incremental_purchases', ascending=False).reset_index()
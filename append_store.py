@@ -0,0 +1,227 @@
+"""Append-only ingestion of daily promo drops into a columnar store and running aggregates
+
+Each new CSV in a drop directory is parsed, segmented and aggregated once;
+its segmented rows become one Feather part and its cube cells are folded into
+the running cube. Historical parts are never re-read, re-segmented or copied:
+they stay memory-mapped, and the combined row frame is only assembled when a
+row-level consumer asks for it. An append costs time proportional to the new
+file only.
+
+Usage: python append_store.py DROP_DIR [--store STORE_DIR]
+"""
+import argparse
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+import pyarrow as pa
+
+from aggregate_cube import INCOME_BUCKET_WIDTH, AggregateCube
+from config import CACHE_DIR
+from filter_index import FilterIndex
+from ingest import (SCHEMA_VERSION, atomic_path, concat_typed, read_columnar, read_csv_arrow, source_files,
+                    write_feather_atomic)
+from profiling import get_profiler
+from segmentation import AGE_BINS, INCOME_BINS, SEGMENT_RULES, preprocess
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = 'manifest.json'
+
+
+def store_fingerprint():
+    """Identity of everything baked into stored parts; a change forces a rebuild"""
+    return repr((SCHEMA_VERSION, SEGMENT_RULES, INCOME_BINS, AGE_BINS, INCOME_BUCKET_WIDTH))
+
+
+def default_store_dir(source_dir, cache_dir=CACHE_DIR):
+    """Store location for a drop directory"""
+    return os.path.join(cache_dir, 'append', os.path.basename(os.path.normpath(source_dir)))
+
+
+def _file_entry(path):
+    stat = os.stat(path)
+    return {'name': os.path.basename(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _write_json_atomic(payload, path):
+    with atomic_path(path) as tmp_path, open(tmp_path, 'w') as out:
+        json.dump(payload, out, indent=1)
+
+
+class AppendStore:
+    """Segmented Feather parts plus the running cube for one drop directory
+    
+    ``manifest.json`` lists the ingested files (name, size, mtime, rows and
+    part file) and the cube file covering exactly those files. It is rewritten
+    last, after the part and the new cube are on disk, so a crash mid-append
+    leaves the previous state intact. Drops are assumed immutable: if an
+    ingested file changes or disappears the store is rebuilt from scratch.
+    """
+    
+    def __init__(self, source_dir, store_dir=None):
+        self.source_dir = source_dir
+        self.store_dir = store_dir or default_store_dir(source_dir)
+        self.manifest_path = os.path.join(self.store_dir, MANIFEST_NAME)
+        self.manifest = None
+        self.cube = None
+        self._parts = []
+        self._indexes = []
+        self._df = None
+        self._lock = threading.Lock()
+    
+    def _empty_manifest(self):
+        return {'fingerprint': store_fingerprint(), 'files': [], 'cube': None}
+    
+    def _load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return self._empty_manifest()
+        with open(self.manifest_path) as f:
+            manifest = json.load(f)
+        if manifest.get('fingerprint') != store_fingerprint():
+            logger.warning("Append store %s was built with other rules; rebuilding", self.store_dir)
+            return self._empty_manifest()
+        return manifest
+    
+    def _path(self, name):
+        return os.path.join(self.store_dir, name)
+    
+    def _is_intact(self, manifest):
+        """True when every ingested file is still present and unchanged"""
+        for entry in manifest['files']:
+            source = os.path.join(self.source_dir, entry['name'])
+            recorded = {key: entry[key] for key in ('name', 'size', 'mtime_ns')}
+            if not os.path.exists(source) or _file_entry(source) != recorded:
+                logger.warning("%s changed after it was appended; rebuilding %s", source, self.store_dir)
+                return False
+        return True
+    
+    def _clear(self):
+        """Remove stored parts and cubes before a rebuild"""
+        if os.path.isdir(self.store_dir):
+            for name in os.listdir(self.store_dir):
+                if name.endswith('.feather'):
+                    os.remove(self._path(name))
+    
+    def open(self):
+        """Load the manifest, running cube and memory-mapped stored parts"""
+        manifest = self._load_manifest()
+        if not manifest['files'] or not self._is_intact(manifest):
+            manifest = self._empty_manifest()
+            self._clear()
+        self.manifest = manifest
+        self.cube = AggregateCube(read_columnar(self._path(manifest['cube']))) if manifest['cube'] else None
+        self._parts = [read_columnar(self._path(entry['part'])) for entry in manifest['files']]
+        self._indexes = [FilterIndex(part) for part in self._parts]
+        self._df = None
+        return self
+    
+    def pending(self):
+        """Source files not yet in the store, in name order"""
+        ingested = {entry['name'] for entry in self.manifest['files']}
+        return [path for path in source_files(self.source_dir) if os.path.basename(path) not in ingested]
+    
+    def _append_file(self, path, part_name):
+        """Parse, segment, store and aggregate one drop; returns its manifest entry and cube"""
+        profiler = get_profiler()
+        with profiler.stage('append_parse'):
+            table = read_csv_arrow(path)
+        with profiler.stage('append_segment'):
+            part = preprocess(table.to_pandas(split_blocks=True))
+        with profiler.stage('append_write'):
+            write_feather_atomic(pa.Table.from_pandas(part, preserve_index=False), self._path(part_name))
+        with profiler.stage('append_cube'):
+            cube = AggregateCube.from_frame(part)
+        entry = dict(_file_entry(path), rows=len(part), part=part_name, appended_at=time.time())
+        return entry, cube
+    
+    def sync(self):
+        """Append every new drop; returns the manifest entries added (empty when up to date)"""
+        with self._lock:
+            if self.manifest is None or not self._is_intact(self.manifest):
+                self.open()
+            files, cubes = list(self.manifest['files']), []
+            for path in self.pending():
+                entry, cube = self._append_file(path, f'part-{len(files):05d}.feather')
+                files.append(entry)
+                cubes.append(cube)
+            if not cubes:
+                return []
+            
+            # Only the new cells are merged: the cube size, not the history, bounds this step
+            with get_profiler().stage('append_fold'):
+                cube = AggregateCube.combine(([self.cube] if self.cube is not None else []) + cubes)
+                cube_name = f'cube-{len(files):05d}.feather'
+                write_feather_atomic(pa.Table.from_pandas(cube.cells, preserve_index=False), self._path(cube_name))
+            # The manifest is the commit point; until it is replaced the previous state stands
+            previous_cube = self.manifest['cube']
+            self.manifest = dict(self.manifest, files=files, cube=cube_name)
+            _write_json_atomic(self.manifest, self.manifest_path)
+            if previous_cube:
+                os.remove(self._path(previous_cube))
+            
+            self.cube = cube
+            # New parts are mapped from the files just written and indexed on their own rows;
+            # history is left untouched. Snapshots keep the part lists they were given
+            added = files[len(files) - len(cubes):]
+            new_parts = [read_columnar(self._path(entry['part'])) for entry in added]
+            self._parts = self._parts + new_parts
+            with get_profiler().stage('append_index'):
+                self._indexes = self._indexes + [FilterIndex(part) for part in new_parts]
+            self._df = None
+            return added
+    
+    @property
+    def parts(self):
+        """Stored rows as one memory-mapped frame per ingested file, in append order"""
+        return list(self._parts)
+    
+    def current_parts(self):
+        """The current parts with their filter indexes and the cube covering them, read together"""
+        with self._lock:
+            return list(self._parts), list(self._indexes), self.cube
+    
+    @property
+    def frame(self):
+        """Every stored row, segmented, in append order (None when the store is empty)
+        
+        Assembled on first use after each append and reused until the next
+        one; a store holding a single part returns its memory-mapped frame.
+        """
+        with self._lock:
+            if self._df is None and self._parts:
+                self._df = concat_typed(self._parts)
+            return self._df
+    
+    @property
+    def n_files(self):
+        return len(self.manifest['files']) if self.manifest else 0
+
+
+@functools.lru_cache(maxsize=None)
+def open_append_store(source_dir, store_dir=None):
+    """The process-wide store for a drop directory, opened once"""
+    return AppendStore(source_dir, store_dir).open()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('source_dir')
+    parser.add_argument('--store', default=None, help='store directory (default: under the cache directory)')
+    args = parser.parse_args()
+    
+    store = AppendStore(args.source_dir, args.store).open()
+    start = time.perf_counter()
+    added = store.sync()
+    elapsed = time.perf_counter() - start
+    for entry in added:
+        print(f"appended {entry['name']}: {entry['rows']:,} rows")
+    print(f"{len(added)} new file(s) in {elapsed:.2f}s; store holds {store.n_files} file(s), "
+          f"{int(store.cube.totals()['count']) if store.cube is not None else 0:,} rows")
+
+
+if __name__ == '__main__':
+    main()
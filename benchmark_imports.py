@@ -0,0 +1,73 @@
+"""Import-time benchmark guarding the dashboard's cold start
+
+Usage: python benchmark_imports.py [--repeat 5]
+
+Each module is imported in a fresh interpreter with ``-X importtime``; the
+best-of-N cumulative time is compared with IMPORT_BUDGETS_MS and the run
+fails (exit code 1) if a budget is exceeded or if a module pulls in one of
+its FORBIDDEN_IMPORTS.
+"""
+import argparse
+import re
+import subprocess
+import sys
+
+# Cumulative import time budgets (ms), with headroom over a typical dev machine
+IMPORT_BUDGETS_MS = {
+    'uplift_core': 800,
+    'uplift_models': 600,
+    'score_customers': 1200,
+}
+
+# Heavy dependencies that must stay lazy for these modules
+FORBIDDEN_IMPORTS = {
+    'uplift_core': ['sklearn', 'streamlit', 'plotly', 'matplotlib', 'seaborn'],
+    'uplift_models': ['sklearn', 'streamlit', 'plotly'],
+    'score_customers': ['streamlit', 'plotly', 'matplotlib', 'seaborn'],
+}
+
+_IMPORTTIME_LINE = re.compile(r'import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def measure(module):
+    """Return (cumulative ms for ``module``, set of modules imported) in a fresh interpreter"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            capture_output=True, text=True, check=True)
+    cumulative_ms, imported = None, set()
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        name = match.group(4)
+        imported.add(name.split('.')[0])
+        if name == module:
+            cumulative_ms = int(match.group(2)) / 1000
+    return cumulative_ms, imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('modules', nargs='*', default=list(IMPORT_BUDGETS_MS))
+    args = parser.parse_args()
+    
+    failures = []
+    print(f"{'module':>18} {'best ms':>9} {'budget':>8}  status")
+    for module in args.modules:
+        runs = [measure(module) for _ in range(args.repeat)]
+        best_ms = min(ms for ms, _ in runs)
+        budget = IMPORT_BUDGETS_MS.get(module)
+        leaked = sorted(set(FORBIDDEN_IMPORTS.get(module, [])) & runs[0][1])
+        status = 'ok'
+        if budget is not None and best_ms > budget:
+            status = 'OVER BUDGET'
+        if leaked:
+            status = f"imports {', '.join(leaked)}"
+        if status != 'ok':
+            failures.append(module)
+        print(f"{module:>18} {best_ms:>9.1f} {budget if budget is not None else '-':>8}  {status}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
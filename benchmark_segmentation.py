@@ -0,0 +1,57 @@
+"""Benchmark vectorized segmentation against the legacy row-wise implementation
+
+Usage: python benchmark_segmentation.py [--sizes 1000000 10000000] [--legacy-max-rows N]
+"""
+import argparse
+import time
+
+from segmentation import assign_segments
+from synthetic_data import generate_frame
+
+
+def legacy_segments(df):
+    """The original per-row ``df.apply`` implementation, kept for comparison"""
+    def create_segment(row):
+        if row['customer_status'] == 'New':
+            return 'New Customers'
+        elif row['customer_status'] == 'Lapsed':
+            return 'Lapsed Customers'
+        elif row['total_spent_last_month'] > 200:
+            return 'High-Value Existing'
+        else:
+            return 'Regular Existing'
+    
+    return df.apply(create_segment, axis=1)
+
+
+def time_call(fn, df):
+    start = time.perf_counter()
+    result = fn(df)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000_000, 10_000_000])
+    parser.add_argument('--legacy-max-rows', type=int, default=None,
+                        help='skip the (slow) legacy implementation above this many rows')
+    args = parser.parse_args()
+    
+    print(f"{'rows':>12} {'impl':>10} {'seconds':>10} {'rows/sec':>14}")
+    for n_rows in args.sizes:
+        # Only the columns the segment rules read
+        df = generate_frame(n_rows)[['customer_status', 'total_spent_last_month']]
+        seconds, vectorized = time_call(assign_segments, df)
+        print(f"{n_rows:>12,} {'vectorized':>10} {seconds:>10.3f} {n_rows / seconds:>14,.0f}")
+        
+        if args.legacy_max_rows is not None and n_rows > args.legacy_max_rows:
+            print(f"{n_rows:>12,} {'legacy':>10} {'skipped':>10}")
+            continue
+        seconds, legacy = time_call(legacy_segments, df)
+        print(f"{n_rows:>12,} {'legacy':>10} {seconds:>10.3f} {n_rows / seconds:>14,.0f}")
+        # Both implementations must agree row for row
+        assert (vectorized.astype(str).to_numpy() == legacy.to_numpy()).all()
+
+
+if __name__ == '__main__':
+    main()
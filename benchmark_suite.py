@@ -0,0 +1,148 @@
+"""Time every pipeline stage on synthetic data at several scales and record results per commit
+
+Usage: python benchmark_suite.py [--sizes 10000 100000 1000000] [--fit-max-rows 1000000] [--compare]
+"""
+import argparse
+import json
+import os
+import subprocess
+import time
+
+from aggregate_cube import AggregateCube
+from bootstrap import bootstrap_uplift
+from config import CACHE_DIR
+from filter_index import FilterIndex
+from ingest import columnar_cache_path
+from profiling import Profiler, peak_rss_mb
+from synthetic_data import ensure_synthetic_csv
+from uplift_core import calculate_customer_segments, calculate_uplift_metrics, load_data
+
+# Results accumulate here, one JSON line per (commit, size) run
+RESULTS_PATH = os.path.join(CACHE_DIR, 'benchmark_results.jsonl')
+# A representative sidebar state for the filter and roll-up stages
+BENCHMARK_SELECTIONS = {'channel': 'SMS', 'customer_segment': 'All', 'promo_type': 'All', 'product_category': 'All'}
+BENCHMARK_INCOME_RANGE = (20_000, 70_000)
+
+
+def git_revision():
+    """Short commit hash of the working tree, suffixed with '-dirty' when it has changes"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True,
+                               text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return f'{commit}-dirty' if dirty else commit
+
+
+def run_pipeline(path, n_rows, fit_max_rows, max_iter):
+    """Run load, segment, uplift, filter, groupby and fit on one dataset; return the profiler"""
+    profiler = Profiler()
+    cache_path = columnar_cache_path(path)
+    if os.path.exists(cache_path):
+        os.remove(cache_path)
+    
+    with profiler.stage('load_cold'):
+        load_data(path)
+    with profiler.stage('load_warm'):
+        df = load_data(path)
+    with profiler.stage('segment'):
+        df = calculate_customer_segments(df)
+    with profiler.stage('aggregate_cube'):
+        cube = AggregateCube.from_frame(df)
+    with profiler.stage('uplift'):
+        segment_stats = cube.rollup(['customer_segment', 'promo_exposed'], BENCHMARK_SELECTIONS,
+                                    BENCHMARK_INCOME_RANGE)
+        calculate_uplift_metrics(segment_stats)
+    with profiler.stage('bootstrap'):
+        bootstrap_uplift(segment_stats)
+    with profiler.stage('filter_index'):
+        filter_index = FilterIndex(df)
+    with profiler.stage('filter'):
+        filter_index.select(BENCHMARK_SELECTIONS, BENCHMARK_INCOME_RANGE)
+    with profiler.stage('groupby'):
+        for dim in ('channel', 'product_category', 'customer_status'):
+            cube.breakdown([dim, 'promo_exposed'], BENCHMARK_SELECTIONS, BENCHMARK_INCOME_RANGE)
+    with profiler.stage('groupby_rows'):
+        # The row-level equivalent the cube replaced, kept as a scaling reference
+        df.groupby(['customer_segment', 'promo_exposed'], observed=True).agg(
+            {'purchase_made': 'mean', 'basket_size': ['mean', 'count']})
+    
+    if fit_max_rows:
+        # Imported here so runs without a fit never load scikit-learn
+        from uplift_models import UpliftModel
+        sample = df if n_rows <= fit_max_rows else df.sample(fit_max_rows, random_state=42)
+        with profiler.stage('model_fit'):
+            UpliftModel('t', max_iter=max_iter, random_state=42).fit(sample)
+    return profiler
+
+
+def record_result(results_path, revision, n_rows, profiler):
+    """Append one run to the results file and return the record"""
+    record = {
+        'commit': revision,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'rows': n_rows,
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'stages': {r['stage']: {'seconds': round(r['wall_ms'] / 1000, 4), 'rss_delta_mb': r['rss_delta_mb']}
+                   for r in profiler.records},
+    }
+    os.makedirs(os.path.dirname(results_path) or '.', exist_ok=True)
+    with open(results_path, 'a') as out:
+        out.write(json.dumps(record) + '\n')
+    return record
+
+
+def load_results(results_path):
+    """Every recorded run, oldest first"""
+    if not os.path.exists(results_path):
+        return []
+    with open(results_path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def previous_result(results, revision, n_rows):
+    """The latest run at this size from a different commit, if any"""
+    for record in reversed(results):
+        if record['rows'] == n_rows and record['commit'] != revision:
+            return record
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--fit-max-rows', type=int, default=1_000_000,
+                        help='fit the uplift model on a sample of at most this many rows (0 skips the fit)')
+    parser.add_argument('--max-iter', type=int, default=100)
+    parser.add_argument('--results', default=RESULTS_PATH)
+    parser.add_argument('--compare', action='store_true', help='compare against the latest run from another commit')
+    args = parser.parse_args()
+    
+    revision = git_revision()
+    history = load_results(args.results)
+    print(f"commit {revision}")
+    print(f"{'rows':>12} {'stage':>16} {'seconds':>10} {'rows/sec':>14} {'rss MB':>8}" +
+          (f" {'previous s':>11} {'change':>8}" if args.compare else ''))
+    for n_rows in args.sizes:
+        path = ensure_synthetic_csv(n_rows, args.seed)
+        profiler = run_pipeline(path, n_rows, args.fit_max_rows, args.max_iter)
+        record = record_result(args.results, revision, n_rows, profiler)
+        previous = previous_result(history, revision, n_rows) if args.compare else None
+        
+        for stage, stats in record['stages'].items():
+            seconds = stats['seconds']
+            line = (f"{n_rows:>12,} {stage:>16} {seconds:>10.4f} {n_rows / max(seconds, 1e-9):>14,.0f} "
+                    f"{stats['rss_delta_mb']:>8.1f}")
+            if args.compare:
+                before = previous['stages'].get(stage, {}).get('seconds') if previous else None
+                line += (f" {before:>11.4f} {(seconds - before) / before:>+8.1%}" if before
+                         else f" {'-':>11} {'-':>8}")
+            print(line)
+    print(f"Results appended to {args.results}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+"""Benchmark fit and batch-scoring time of the S-, T- and X-learners
+
+Usage: python benchmark_uplift_models.py [--rows 1000000] [--learners s t x]
+"""
+import argparse
+import time
+
+from segmentation import preprocess
+from synthetic_data import generate_frame
+from uplift_models import LEARNERS, UpliftModel
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--learners', nargs='+', default=list(LEARNERS), choices=LEARNERS)
+    parser.add_argument('--max-iter', type=int, default=100)
+    args = parser.parse_args()
+    
+    # The synthetic lift varies with customer status and promo type
+    df = preprocess(generate_frame(args.rows))
+    per_million = 1_000_000 / args.rows
+    print(f"{'learner':>8} {'fit s':>8} {'score s':>8} {'fit s/1M':>9} {'score s/1M':>11} {'rows/sec':>12}")
+    for learner in args.learners:
+        model = UpliftModel(learner, max_iter=args.max_iter, random_state=42)
+        start = time.perf_counter()
+        model.fit(df)
+        fit_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        model.predict_uplift(df)
+        score_seconds = time.perf_counter() - start
+        print(f"{learner:>8} {fit_seconds:>8.2f} {score_seconds:>8.2f} {fit_seconds * per_million:>9.2f} "
+              f"{score_seconds * per_million:>11.2f} {args.rows / score_seconds:>12,.0f}")
+
+
+if __name__ == '__main__':
+    main()
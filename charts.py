@@ -0,0 +1,178 @@
+"""Chart payloads built from pre-aggregated arrays, one vectorized pass per figure"""
+import numpy as np
+import plotly.colors
+import plotly.graph_objects as go
+import plotly.io as pio
+
+from config import CHART_MAX_CATEGORIES
+from profiling import get_profiler
+
+# Decimal places kept in chart payloads; finer precision is invisible on screen
+CHART_DECIMALS = 4
+# Label for the categories folded together once a chart exceeds its category cap
+OTHER_LABEL = 'Other'
+EXPOSURE_TRACES = ((0, 'Control', 'lightblue'), (1, 'Treatment', 'darkblue'))
+STATUS_SYMBOLS = {0: 'circle', 1: 'diamond'}
+# Largest marker diameter (px) in the status scatter; area scales with row count
+MAX_MARKER_SIZE = 40
+
+
+def _rounded(values):
+    """Float array trimmed to the payload precision"""
+    return np.round(np.asarray(values, dtype=float), CHART_DECIMALS)
+
+
+def cap_categories(breakdown, dim, max_categories=CHART_MAX_CATEGORIES):
+    """Keep the largest categories of a breakdown and fold the rest into one 'Other' row per exposure"""
+    totals = breakdown.groupby(dim, observed=True)['count'].sum()
+    if len(totals) <= max_categories:
+        return breakdown
+    kept = totals.nlargest(max_categories - 1).index
+    labels = breakdown[dim].astype(str).where(breakdown[dim].isin(kept), OTHER_LABEL)
+    # Means are recombined through their sums so 'Other' is weighted by row count
+    sums = breakdown.assign(**{
+        dim: labels,
+        'purchase_made': breakdown['purchase_made'] * breakdown['count'],
+        'basket_size': breakdown['basket_size'] * breakdown['count'],
+    }).groupby([dim, 'promo_exposed'], sort=False, as_index=False).sum()
+    # 'Other' goes last; kept categories stay in their original order
+    sums = sums.iloc[np.argsort(sums[dim].eq(OTHER_LABEL).to_numpy(), kind='stable')]
+    return sums.assign(purchase_made=sums['purchase_made'] / sums['count'],
+                       basket_size=sums['basket_size'] / sums['count'])
+
+
+def _by_exposure(frame, dim, measure):
+    """Category labels plus one aligned value array per exposure group"""
+    table = frame.pivot_table(index=dim, columns='promo_exposed', values=measure, observed=True, sort=False)
+    table = table.reindex(columns=[0, 1])
+    return table.index.astype(str).tolist(), {exposed: _rounded(table[exposed]) for exposed in (0, 1)}
+
+
+def uplift_figure(uplift_pivot):
+    """Uplift % per segment with bootstrap intervals as asymmetric error bars"""
+    pct = uplift_pivot['uplift_percentage'].to_numpy(dtype=float)
+    fig = go.Figure(go.Bar(
+        x=uplift_pivot['customer_segment'].astype(str).tolist(),
+        y=_rounded(pct),
+        error_y=dict(type='data', symmetric=False,
+                     array=_rounded(uplift_pivot['uplift_pct_ci_high'].to_numpy(dtype=float) - pct),
+                     arrayminus=_rounded(pct - uplift_pivot['uplift_pct_ci_low'].to_numpy(dtype=float))),
+        marker=dict(color=_rounded(pct), colorscale='RdYlGn', showscale=True,
+                    colorbar=dict(title='uplift_percentage')),
+    ))
+    fig.update_layout(
+        title='Promotional Uplift by Customer Segment',
+        xaxis_title="Customer Segment",
+        yaxis_title="Uplift Percentage (%)",
+        showlegend=False
+    )
+    return fig
+
+
+def exposure_bar_figure(frame, dim, measure, title, xaxis_title, yaxis_title):
+    """Grouped bars with one Control and one Treatment trace, however many categories there are"""
+    labels, values = _by_exposure(frame, dim, measure)
+    fig = go.Figure([go.Bar(name=name, x=labels, y=values[exposed], marker_color=color)
+                     for exposed, name, color in EXPOSURE_TRACES])
+    fig.update_layout(title=title, xaxis_title=xaxis_title, yaxis_title=yaxis_title, barmode='group')
+    return fig
+
+
+def response_figure(uplift_analysis):
+    """Control vs treatment response rate per segment"""
+    return exposure_bar_figure(uplift_analysis, 'customer_segment', 'response_rate',
+                               'Response Rates: Control vs Treatment', "Customer Segment", "Response Rate")
+
+
+def status_figure(status_analysis):
+    """Response rate vs basket size per customer status, marker area by row count"""
+    statuses = status_analysis['customer_status'].astype(str)
+    palette = plotly.colors.qualitative.Plotly
+    codes = {status: i for i, status in enumerate(sorted(statuses.unique()))}
+    colors = np.array([palette[codes[s] % len(palette)] for s in statuses])
+    counts = status_analysis['count'].to_numpy(dtype=float)
+    sizeref = 2.0 * counts.max() / MAX_MARKER_SIZE ** 2 if len(counts) and counts.max() > 0 else 1.0
+    
+    traces = []
+    for exposed, name, _ in EXPOSURE_TRACES:
+        mask = (status_analysis['promo_exposed'] == exposed).to_numpy()
+        traces.append(go.Scatter(
+            name=name,
+            x=_rounded(status_analysis['purchase_made'].to_numpy()[mask]),
+            y=_rounded(status_analysis['basket_size'].to_numpy()[mask]),
+            text=statuses[mask].tolist(),
+            customdata=counts[mask].astype(int),
+            mode='markers+text',
+            textposition='top center',
+            marker=dict(color=colors[mask].tolist(), symbol=STATUS_SYMBOLS[exposed], size=counts[mask],
+                        sizemode='area', sizeref=sizeref),
+            hovertemplate='%{text}<br>Response rate %{x}<br>Basket size £%{y}<br>%{customdata} rows',
+        ))
+    fig = go.Figure(traces)
+    fig.update_layout(
+        title='Customer Status Performance: Response Rate vs Basket Size',
+        xaxis_title="Response Rate",
+        yaxis_title="Average Basket Size (£)"
+    )
+    return fig
+
+
+def qini_figure(curve):
+    """Qini curve of the model against random targeting"""
+    x = _rounded(curve['fraction_targeted'] * 100)
+    fig = go.Figure([
+        go.Scatter(name='Model', x=x, y=_rounded(curve['qini']), mode='lines', line=dict(color='darkblue')),
+        go.Scatter(name='Random', x=x, y=_rounded(curve['random']), mode='lines',
+                   line=dict(color='grey', dash='dash')),
+    ])
+    fig.update_layout(
+        title='Qini Curve (held-out customers)',
+        xaxis_title="Customers Targeted (% by descending uplift score)",
+        yaxis_title="Incremental Purchases"
+    )
+    return fig
+
+
+class FigureSet(dict):
+    """Figures by chart name; ``nbytes`` (their serialized size) bounds them in the result cache"""
+    nbytes = 0
+
+
+def strip_template(fig):
+    """Drop the default template from a figure that is built once and drawn on every rerun"""
+    # The Streamlit theme styles charts client-side, so the default template (most of the bytes) is dropped
+    fig.update_layout(template=None)
+    return fig
+
+
+def build_chart_figures(cube, uplift_analysis, uplift_pivot, selections=None, income_range=None,
+                        max_categories=CHART_MAX_CATEGORIES):
+    """Figures for every dashboard chart under one filter state
+    
+    Cached ``go.Figure`` objects go to ``st.plotly_chart`` as they are, which
+    skips the validation pass a JSON dict would get on every rerun.
+    """
+    profiler = get_profiler()
+    breakdowns = {}
+    for dim in ('channel', 'product_category', 'customer_status'):
+        with profiler.stage(f'groupby:{dim}'):
+            breakdowns[dim] = cap_categories(cube.breakdown([dim, 'promo_exposed'], selections, income_range),
+                                              dim, max_categories)
+    
+    builders = {
+        'uplift': (uplift_figure, (uplift_pivot,)),
+        'response': (response_figure, (uplift_analysis,)),
+        'channel': (exposure_bar_figure, (breakdowns['channel'], 'channel', 'purchase_made',
+                                          'Response Rate by Channel', "Channel", "Response Rate")),
+        'category': (exposure_bar_figure, (breakdowns['product_category'], 'product_category', 'basket_size',
+                                           'Average Basket Size by Product Category', "Product Category",
+                                           "Average Basket Size (£)")),
+        'status': (status_figure, (breakdowns['customer_status'],)),
+    }
+    figures = FigureSet()
+    for name, (build, args) in builders.items():
+        with profiler.stage(f'figure:{name}') as record:
+            figures[name] = strip_template(build(*args))
+            record['payload_bytes'] = len(pio.to_json(figures[name], validate=False))
+            figures.nbytes += record['payload_bytes']
+    return figures
@@ -0,0 +1,74 @@
+"""Runtime configuration for the promo uplift dashboard"""
+import json
+import os
+
+# Source data and on-disk artefact locations (overridable per deployment)
+DATA_PATH = os.environ.get('PROMO_DATA_PATH', 'promo_uplift_enriched.csv')
+MODEL_DIR = os.environ.get('PROMO_MODEL_DIR', 'models')
+CACHE_DIR = os.environ.get('PROMO_CACHE_DIR', '.cache')
+
+# Number of persisted models kept in MODEL_DIR before the oldest are pruned
+MODEL_REGISTRY_MAX_ENTRIES = int(os.environ.get('PROMO_MODEL_REGISTRY_MAX_ENTRIES', '5'))
+# Best configuration from `python tuning.py`; used in place of the default model parameters when present
+TUNED_PARAMS_PATH = os.environ.get('PROMO_TUNED_PARAMS', os.path.join(MODEL_DIR, 'tuned_params.json'))
+
+# Bounds for the per-process cache of filter-aware uplift results
+UPLIFT_CACHE_MAX_ENTRIES = int(os.environ.get('PROMO_UPLIFT_CACHE_MAX_ENTRIES', '256'))
+UPLIFT_CACHE_MAX_BYTES = int(os.environ.get('PROMO_UPLIFT_CACHE_MAX_MB', '64')) * 1024 * 1024
+
+# Out-of-core mode: stream the source in chunks and keep only aggregates in memory
+STREAMING_MODE = os.environ.get('PROMO_STREAMING', '0') == '1'
+STREAM_CHUNK_SIZE = int(os.environ.get('PROMO_STREAM_CHUNK_SIZE', '500000'))
+# Soft RSS budget (MB); chunks shrink when it is exceeded. 0 disables the check.
+STREAM_MAX_RSS_MB = float(os.environ.get('PROMO_STREAM_MAX_RSS_MB', '0'))
+
+# Append mode (DATA_PATH a directory of daily drops): each new CSV is segmented and folded
+# into a persistent columnar store and running cube under CACHE_DIR, without reprocessing history
+APPEND_MODE = os.environ.get('PROMO_APPEND_MODE', '0') == '1'
+
+# Query backend for filters and roll-ups: 'pandas' (in-memory cube and row index), or an
+# embedded database under CACHE_DIR: 'sqlite', 'duckdb', or 'sql' (DuckDB when installed, else SQLite)
+QUERY_BACKEND = os.environ.get('PROMO_QUERY_BACKEND', 'pandas')
+
+# Partitioned cold start: >1 preprocesses and aggregates partitions in a process pool
+PARALLEL_WORKERS = int(os.environ.get('PROMO_PARALLEL_WORKERS', '1'))
+# 'rows' (contiguous row ranges), 'product_category' or 'channel'
+PARALLEL_PARTITION_BY = os.environ.get('PROMO_PARALLEL_PARTITION_BY', 'rows')
+
+# Bootstrap confidence intervals for segment uplift
+BOOTSTRAP_REPLICATES = int(os.environ.get('PROMO_BOOTSTRAP_REPLICATES', '2000'))
+BOOTSTRAP_CONFIDENCE = float(os.environ.get('PROMO_BOOTSTRAP_CONFIDENCE', '0.95'))
+# 'binomial' (resample per-cell outcomes) or 'poisson' (Poisson(1) row weights)
+BOOTSTRAP_METHOD = os.environ.get('PROMO_BOOTSTRAP_METHOD', 'binomial')
+
+# Optional Prometheus textfile the dashboard rewrites after every run ('' disables)
+PROFILE_PROMETHEUS_PATH = os.environ.get('PROMO_PROFILE_PROM_FILE', '')
+
+# Most categories drawn per chart; the smallest beyond this are folded into "Other"
+CHART_MAX_CATEGORIES = int(os.environ.get('PROMO_CHART_MAX_CATEGORIES', '25'))
+
+# Background refresh: seconds between checks of DATA_PATH (a CSV or a directory of
+# daily CSV drops) for changes; 0 checks synchronously on every rerun instead
+REFRESH_INTERVAL_SECONDS = float(os.environ.get('PROMO_REFRESH_INTERVAL', '30'))
+# Opt-in: fit (or load) the uplift model for each new snapshot before it is swapped in. Off by
+# default so scikit-learn and the model load only when a model panel first needs them
+REFRESH_WARM_MODEL = os.environ.get('PROMO_REFRESH_WARM_MODEL', '0') == '1'
+
+# Budget allocation: cost per contact (£) as JSON objects, delivery by channel plus the expected cost of
+# the offer; a channel or promo type missing from its table costs half of PROMO_DEFAULT_CONTACT_COST
+CHANNEL_COSTS = json.loads(os.environ.get('PROMO_CHANNEL_COSTS',
+                                          '{"Email": 0.02, "App Notification": 0.01, "SMS": 0.08}'))
+PROMO_COSTS = json.loads(os.environ.get('PROMO_PROMO_COSTS',
+                                        '{"Loyalty Points": 0.50, "Coupon": 1.00, "Discount": 1.50, "BOGO": 2.50}'))
+DEFAULT_CONTACT_COST = float(os.environ.get('PROMO_DEFAULT_CONTACT_COST', '1.00'))
+
+# Model evaluation panel: share of rows held out, and a cap on training rows (0 = no cap)
+EVALUATION_TEST_FRACTION = float(os.environ.get('PROMO_EVALUATION_TEST_FRACTION', '0.3'))
+EVALUATION_MAX_TRAIN_ROWS = int(os.environ.get('PROMO_EVALUATION_MAX_TRAIN_ROWS', '500000'))
+
+# Exports: rows per chunk and minimum rows per Parquet row group, and where dashboard exports are written
+EXPORT_CHUNK_ROWS = int(os.environ.get('PROMO_EXPORT_CHUNK_ROWS', '250000'))
+EXPORT_DIR = os.environ.get('PROMO_EXPORT_DIR', os.path.join(CACHE_DIR, 'exports'))
+# Largest export offered as a browser download (Streamlit holds the whole file in server memory);
+# larger ones are only written to EXPORT_DIR
+EXPORT_MAX_DOWNLOAD_ROWS = int(os.environ.get('PROMO_EXPORT_MAX_DOWNLOAD_ROWS', '1000000'))
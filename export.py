@@ -0,0 +1,213 @@
+"""Chunked export of filtered rows, uplift scores and computed tables to CSV or Parquet
+
+Rows are read, optionally scored, and written EXPORT_CHUNK_ROWS at a time,
+straight from the snapshot's filter index, the SQL backend's cursor or (in
+streaming mode) the source CSVs, so memory stays bounded by one chunk however
+many rows match. Small filtered chunks are buffered into row groups of at
+least EXPORT_CHUNK_ROWS rows; files are written under a temporary name and
+renamed when complete.
+
+Usage: python export.py rows|scores OUTPUT [--columns ...] [--where channel=Email ...] [--income LOW HIGH]
+"""
+import argparse
+import hashlib
+import os
+import time
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from aggregate_cube import income_edges
+from config import DATA_PATH, EXPORT_CHUNK_ROWS, EXPORT_DIR
+from filter_index import is_unfiltered
+from ingest import SCHEMA, atomic_path, concat_typed, prune_oldest, read_csv_typed, source_files
+from segmentation import preprocess
+
+ROW_COLUMNS = list(SCHEMA) + ['income_segment', 'age_segment', 'customer_segment']
+SCORE_COLUMNS = ['customer_id', 'customer_segment', 'uplift_score']
+EXPORT_FORMATS = {'csv': 'text/csv', 'parquet': 'application/vnd.apache.parquet'}
+# Exports kept in EXPORT_DIR before the oldest are pruned
+EXPORT_MAX_FILES = 20
+
+
+class BatchWriter:
+    """Append DataFrame batches to a CSV or Parquet output file"""
+    
+    def __init__(self, path):
+        self.path = path
+        self._parquet = None
+        self._wrote_csv_header = False
+    
+    def write(self, df):
+        if self.path.endswith('.parquet'):
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._parquet is None:
+                self._parquet = pq.ParquetWriter(self.path, table.schema)
+            self._parquet.write_table(table)
+        else:
+            df.to_csv(self.path, mode='a' if self._wrote_csv_header else 'w',
+                      header=not self._wrote_csv_header, index=False)
+            self._wrote_csv_header = True
+    
+    def close(self):
+        if self._parquet is not None:
+            self._parquet.close()
+
+
+def _check_columns(columns):
+    unknown = [col for col in columns or [] if col not in ROW_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown export column(s): {', '.join(unknown)}")
+    return list(columns) if columns else list(ROW_COLUMNS)
+
+
+def row_mask(chunk, selections, value_range=None):
+    """Boolean mask of the rows in a segmented chunk matching the filters (income snapped like the cube)"""
+    mask = np.ones(len(chunk), dtype=bool)
+    for dim, selection in (selections or {}).items():
+        if not is_unfiltered(selection):
+            values = selection if isinstance(selection, list) else [selection]
+            mask &= chunk[dim].isin(values).to_numpy()
+    if value_range is not None:
+        low, high = income_edges(value_range)
+        income = chunk['income'].to_numpy()
+        mask &= (income >= low) & (income < high)
+    return mask
+
+
+def iter_snapshot_positions(snapshot, positions, columns=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Chunks of the snapshot's rows at ``positions`` (all rows when None), in row order"""
+    columns = _check_columns(columns)
+    if positions is None:
+        positions = np.arange(snapshot.n_rows)
+    # An empty selection still yields one (empty) chunk, so the output keeps its header and schema
+    for start in range(0, max(len(positions), 1), chunk_rows):
+        yield snapshot.take(positions[start:start + chunk_rows], columns)
+
+
+def iter_source_rows(path, selections, value_range=None, columns=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Matching rows streamed from the source CSVs, segmented chunk by chunk like the in-memory path"""
+    columns = _check_columns(columns)
+    for source in source_files(path):
+        with read_csv_typed(source, usecols=list(SCHEMA), chunksize=chunk_rows) as reader:
+            for chunk in reader:
+                chunk = preprocess(chunk)
+                yield chunk.loc[row_mask(chunk, selections, value_range), columns]
+
+
+def iter_snapshot_rows(snapshot, selections, value_range=None, columns=None, chunk_rows=EXPORT_CHUNK_ROWS,
+                       path=DATA_PATH):
+    """Matching rows from wherever the snapshot keeps them: in memory, in the SQL backend or only in the source"""
+    if snapshot.has_rows:
+        positions = snapshot.filter_index.select(selections, None if value_range is None else income_edges(value_range))
+        return iter_snapshot_positions(snapshot, positions, columns, chunk_rows)
+    if hasattr(snapshot.cube, 'iter_rows'):
+        return snapshot.cube.iter_rows(selections, value_range, _check_columns(columns), chunk_rows)
+    return iter_source_rows(path, selections, value_range, columns, chunk_rows)
+
+
+def iter_scores(model, chunks, columns=SCORE_COLUMNS):
+    """Score each chunk of segmented rows with an UpliftModel, keeping ``columns``"""
+    for chunk in chunks:
+        scores = model.predict_uplift(chunk) if len(chunk) else np.empty(0, dtype=np.float32)
+        yield chunk.assign(uplift_score=scores)[columns]
+
+
+def write_chunks(chunks, path, row_group_rows=EXPORT_CHUNK_ROWS):
+    """Write DataFrame chunks to ``path`` (.csv or .parquet) atomically; returns the rows written
+    
+    Chunks are buffered until at least ``row_group_rows`` rows are pending,
+    so selective filters do not produce a row group per source chunk.
+    """
+    rows, empty, pending, pending_rows = 0, None, [], 0
+    # The hidden temporary keeps the extension, which selects the format
+    with atomic_path(path) as tmp_path:
+        writer = BatchWriter(tmp_path)
+        try:
+            for chunk in chunks:
+                if len(chunk) == 0:
+                    empty = chunk if empty is None else empty
+                    continue
+                pending.append(chunk)
+                pending_rows += len(chunk)
+                if pending_rows >= row_group_rows:
+                    writer.write(concat_typed(pending))
+                    rows += pending_rows
+                    pending, pending_rows = [], 0
+            if pending:
+                writer.write(concat_typed(pending))
+                rows += pending_rows
+            if rows == 0 and empty is not None:
+                writer.write(empty)
+        finally:
+            writer.close()
+    return rows
+
+
+def export_path(name, key, file_format, export_dir=EXPORT_DIR):
+    """Stable file name for one export (dataset version, filters, columns), so repeats reuse the file"""
+    digest = hashlib.sha256(repr(key).encode()).hexdigest()[:12]
+    return os.path.join(export_dir, f'{name}_{digest}.{file_format}')
+
+
+def prune_exports(export_dir=EXPORT_DIR, max_files=EXPORT_MAX_FILES):
+    """Remove all but the most recently written exports (in-progress temporaries are hidden)"""
+    prune_oldest(export_dir, max_files,
+                 lambda name: os.path.splitext(name)[1][1:] in EXPORT_FORMATS and not name.startswith('.'))
+
+
+def export_file(path, make_chunks):
+    """Write an export unless an identical one is already on disk, then prune old exports"""
+    if not os.path.exists(path):
+        write_chunks(make_chunks(), path)
+        prune_exports(os.path.dirname(path) or '.')
+    return path
+
+
+def read_export(path):
+    """Whole file contents for a download button, so only used up to EXPORT_MAX_DOWNLOAD_ROWS rows"""
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def _parse_where(items):
+    selections = {}
+    for item in items or []:
+        dim, _, value = item.partition('=')
+        selections.setdefault(dim, []).append(value)
+    return selections
+
+
+def main():
+    from shared_store import load_snapshot
+    from uplift_core import load_or_fit_uplift_model, source_signature
+    
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('dataset', choices=['rows', 'scores'])
+    parser.add_argument('output', help='.csv or .parquet')
+    parser.add_argument('--input', default=DATA_PATH)
+    parser.add_argument('--columns', nargs='+', default=None, choices=ROW_COLUMNS)
+    parser.add_argument('--where', nargs='+', default=None, metavar='DIM=VALUE', help='repeat a dimension to OR values')
+    parser.add_argument('--income', nargs=2, type=float, default=None, metavar=('LOW', 'HIGH'),
+                        help='snapped to income buckets; HIGH is exclusive')
+    parser.add_argument('--chunk-rows', type=int, default=EXPORT_CHUNK_ROWS)
+    args = parser.parse_args()
+    
+    selections = _parse_where(args.where)
+    start = time.perf_counter()
+    if args.dataset == 'rows':
+        # Rows stream straight from the source CSVs; nothing but one chunk is held in memory
+        chunks = iter_source_rows(args.input, selections, args.income, args.columns, args.chunk_rows)
+    else:
+        # The model is fitted (or loaded) on the full data; scoring then runs chunk by chunk
+        snapshot = load_snapshot(args.input, source_signature(args.input))
+        model, _ = load_or_fit_uplift_model(snapshot.frame)
+        rows = iter_snapshot_rows(snapshot, selections, args.income, None, args.chunk_rows, args.input)
+        chunks = iter_scores(model, rows)
+    rows = write_chunks(chunks, args.output)
+    print(f"wrote {rows:,} rows to {args.output} in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
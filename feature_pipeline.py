@@ -0,0 +1,89 @@
+"""Serializable feature pipeline: per-column encoders fitted once and reused at scoring time"""
+import numpy as np
+import pandas as pd
+
+NUMERIC_FEATURES = ['age', 'income', 'total_spent_last_month']
+CATEGORICAL_FEATURES = ['customer_segment', 'channel', 'product_category', 'customer_status', 'promo_type']
+
+
+class CategoryEncoder:
+    """Stable category-to-code mapping for one column; unseen values encode as missing"""
+    
+    def __init__(self, column):
+        self.column = column
+        self.categories_ = None
+    
+    def fit(self, series):
+        """Record the sorted distinct values of the column"""
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            categories = series.cat.remove_unused_categories().cat.categories.astype(str)
+        else:
+            categories = pd.unique(series.astype(str))
+        self.categories_ = pd.Index(categories).sort_values()
+        return self
+    
+    @property
+    def mapping(self):
+        """Category to code, as stored with the model"""
+        return {category: code for code, category in enumerate(self.categories_)}
+    
+    def codes(self, series):
+        """Positions of each value in the fitted categories (-1 when unseen)"""
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            # Translate the column's own (small) category list once, then index by its codes
+            lookup = np.append(self.categories_.get_indexer(series.cat.categories.astype(str)), -1)
+            return lookup[series.cat.codes.to_numpy()]
+        return self.categories_.get_indexer(series.astype(str))
+    
+    def transform_into(self, series, out):
+        """Write float codes into ``out`` (NaN for unseen values, which the learners treat as missing)"""
+        codes = self.codes(series)
+        np.copyto(out, codes, casting='unsafe')
+        out[codes < 0] = np.nan
+
+
+class FeaturePipeline:
+    """Numeric pass-through plus per-column category encoders, producing one float32 matrix
+    
+    Fitted once on the training frame and pickled with the model, so scoring
+    reuses the exact training encodings. ``transform`` never modifies or copies
+    its input frame; it reads one column at a time into the output matrix.
+    """
+    
+    def __init__(self, numeric=NUMERIC_FEATURES, categorical=CATEGORICAL_FEATURES):
+        self.numeric = list(numeric)
+        self.categorical = list(categorical)
+        self.encoders_ = None
+    
+    @property
+    def feature_names(self):
+        return self.numeric + self.categorical
+    
+    @property
+    def categorical_mask(self):
+        """Flags marking the encoded columns, for the estimators' ``categorical_features``"""
+        return [False] * len(self.numeric) + [True] * len(self.categorical)
+    
+    @property
+    def mappings(self):
+        """Category-to-code mapping of every encoded column"""
+        return {column: encoder.mapping for column, encoder in self.encoders_.items()}
+    
+    def fit(self, df):
+        """Fit one encoder per categorical column"""
+        self.encoders_ = {column: CategoryEncoder(column).fit(df[column]) for column in self.categorical}
+        return self
+    
+    def transform(self, df):
+        """Feature matrix for ``df`` using the fitted encodings"""
+        if self.encoders_ is None:
+            raise ValueError("FeaturePipeline must be fitted before transform")
+        X = np.empty((len(df), len(self.feature_names)), dtype=np.float32)
+        for i, column in enumerate(self.numeric):
+            X[:, i] = df[column].to_numpy(dtype=np.float32)
+        for i, column in enumerate(self.categorical, start=len(self.numeric)):
+            self.encoders_[column].transform_into(df[column], X[:, i])
+        return X
+    
+    def fit_transform(self, df):
+        return self.fit(df).transform(df)
@@ -0,0 +1,134 @@
+"""Precomputed row indexes for the dashboard's sidebar filters"""
+import numpy as np
+import pandas as pd
+
+FILTER_DIMENSIONS = ['channel', 'customer_segment', 'promo_type', 'product_category']
+ALL = "All"
+
+
+def is_unfiltered(selection):
+    """True when a selection means "no filter" on its dimension"""
+    return selection is None or selection == ALL or (isinstance(selection, list) and ALL in selection)
+
+
+class FilterIndex:
+    """Per-value row positions and bitmaps plus a sorted income array, built once per dataset"""
+    
+    def __init__(self, df, dimensions=FILTER_DIMENSIONS, range_column='income'):
+        self.n_rows = len(df)
+        self.dimensions = list(dimensions)
+        self.range_column = range_column
+        position_dtype = np.int32 if self.n_rows < 2**31 else np.int64
+        
+        self._positions = {}
+        self._bitmaps = {}
+        for dim in self.dimensions:
+            codes, uniques = pd.factorize(df[dim], sort=False)
+            # One stable sort groups rows by value while keeping each group in row order
+            order = np.argsort(codes, kind='stable').astype(position_dtype)
+            counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+            bounds = np.concatenate([[0], np.cumsum(counts)])
+            offset = int((codes < 0).sum())  # missing values sort first; never selectable
+            self._positions[dim] = {}
+            self._bitmaps[dim] = {}
+            for code, value in enumerate(uniques):
+                self._positions[dim][value] = order[offset + bounds[code]:offset + bounds[code + 1]]
+                self._bitmaps[dim][value] = np.packbits(codes == code)
+        
+        self._range_values = df[range_column].to_numpy()
+        self._range_order = np.argsort(self._range_values, kind='stable').astype(position_dtype)
+        self._range_sorted = self._range_values[self._range_order]
+    
+    def values(self, dim):
+        """Distinct values of a dimension in first-appearance order"""
+        return list(self._positions[dim])
+    
+    def range_bounds(self):
+        """Minimum and maximum of the range column"""
+        return self._range_sorted[0], self._range_sorted[-1]
+    
+    def _selection_size(self, dim, selection):
+        values = selection if isinstance(selection, list) else [selection]
+        return sum(len(self._positions[dim].get(value, ())) for value in values)
+    
+    def _value_positions(self, dim, selection):
+        values = selection if isinstance(selection, list) else [selection]
+        arrays = [self._positions[dim].get(value, np.empty(0, dtype=np.int32)) for value in values]
+        return arrays[0] if len(arrays) == 1 else np.sort(np.concatenate(arrays))
+    
+    def _value_mask(self, dim, selection, positions):
+        """Bitmap membership test for a set of candidate positions"""
+        values = selection if isinstance(selection, list) else [selection]
+        byte_index, bit = positions >> 3, 7 - (positions & 7)
+        mask = np.zeros(len(positions), dtype=bool)
+        for value in values:
+            bitmap = self._bitmaps[dim].get(value)
+            if bitmap is not None:
+                mask |= ((bitmap[byte_index] >> bit) & 1).astype(bool)
+        return mask
+    
+    def select(self, selections, value_range=None):
+        """Return sorted row positions matching the filters, or None when nothing is filtered
+        
+        ``selections`` maps dimensions to a value, a list of values or "All";
+        ``value_range`` is a half-open [low, high) range on the range column.
+        """
+        active = {dim: sel for dim, sel in selections.items() if not is_unfiltered(sel)}
+        range_lo, range_hi = 0, self.n_rows
+        if value_range is not None:
+            range_lo = int(np.searchsorted(self._range_sorted, value_range[0], side='left'))
+            range_hi = int(np.searchsorted(self._range_sorted, value_range[1], side='left'))
+        range_active = (range_lo, range_hi) != (0, self.n_rows)
+        if not active and not range_active:
+            return None
+        
+        # Drive the intersection from the most selective filter, then probe the rest
+        candidates = [(self._selection_size(dim, sel), dim) for dim, sel in active.items()]
+        if range_active:
+            candidates.append((range_hi - range_lo, None))
+        _, driver = min(candidates, key=lambda item: item[0])
+        
+        if driver is None:
+            positions = np.sort(self._range_order[range_lo:range_hi])
+        else:
+            positions = self._value_positions(driver, active.pop(driver))
+        for dim, sel in active.items():
+            positions = positions[self._value_mask(dim, sel, positions)]
+        if range_active and driver is not None:
+            values = self._range_values[positions]
+            positions = positions[(values >= value_range[0]) & (values < value_range[1])]
+        return positions
+
+
+class PartitionedFilterIndex:
+    """FilterIndexes over consecutive row ranges, answering like one index over all of them
+    
+    Each partition (e.g. one appended drop) is indexed once, on its own rows;
+    positions from a partition are offset by the rows stored before it.
+    """
+    
+    def __init__(self, indexes):
+        self.indexes = list(indexes)
+        self.offsets = np.cumsum([0] + [index.n_rows for index in self.indexes])
+        self.n_rows = int(self.offsets[-1])
+        self.dimensions = self.indexes[0].dimensions
+        self.range_column = self.indexes[0].range_column
+    
+    def values(self, dim):
+        """Distinct values of a dimension in first-appearance order across partitions"""
+        return list(dict.fromkeys(value for index in self.indexes for value in index.values(dim)))
+    
+    def range_bounds(self):
+        """Minimum and maximum of the range column"""
+        bounds = [index.range_bounds() for index in self.indexes]
+        return min(low for low, _ in bounds), max(high for _, high in bounds)
+    
+    def select(self, selections, value_range=None):
+        """Sorted row positions over all partitions, or None when nothing is filtered (see FilterIndex.select)"""
+        results = [index.select(selections, value_range) for index in self.indexes]
+        if all(positions is None for positions in results):
+            return None
+        return np.concatenate([
+            offset + (np.arange(index.n_rows) if positions is None else positions.astype(np.int64))
+            for index, offset, positions in zip(self.indexes, self.offsets[:-1], results)
+        ])
@@ -0,0 +1,183 @@
+"""Typed ingest of the promo dataset through a memory-mapped columnar cache"""
+import os
+import uuid
+from contextlib import contextmanager
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.feather as feather
+
+from config import CACHE_DIR, DATA_PATH
+
+# Declared column types for the promo export; bump SCHEMA_VERSION when they change
+SCHEMA_VERSION = '1'
+SCHEMA = {
+    'customer_id': 'int32',
+    'age': 'int8',
+    'income': 'float32',
+    'total_spent_last_month': 'float32',
+    'promo_exposed': 'int8',
+    'purchase_made': 'int8',
+    'basket_size': 'int16',
+    'promo_type': 'category',
+    'channel': 'category',
+    'customer_status': 'category',
+    'product_category': 'category',
+}
+
+_ARROW_TYPES = {
+    'int8': pa.int8(),
+    'int16': pa.int16(),
+    'int32': pa.int32(),
+    'float32': pa.float32(),
+    'category': pa.dictionary(pa.int32(), pa.string()),
+}
+
+
+def arrow_schema_types():
+    """Map the declared schema onto Arrow column types"""
+    return {col: _ARROW_TYPES[dtype] for col, dtype in SCHEMA.items()}
+
+
+def read_csv_typed(path=DATA_PATH, **kwargs):
+    """Read the CSV with pandas using the declared schema (supports ``chunksize``)"""
+    return pd.read_csv(path, dtype=SCHEMA, **kwargs)
+
+
+def columnar_cache_path(path=DATA_PATH, cache_dir=CACHE_DIR):
+    """Location of the Feather cache file for a source CSV"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(cache_dir, f'{stem}.feather')
+
+
+def _source_metadata(path):
+    stat = os.stat(path)
+    return {
+        b'source_size': str(stat.st_size).encode(),
+        b'source_mtime_ns': str(stat.st_mtime_ns).encode(),
+        b'schema_version': SCHEMA_VERSION.encode(),
+    }
+
+
+def cache_is_fresh(cache_path, path):
+    """True when the cache exists and was built from the current source file"""
+    if not os.path.exists(cache_path):
+        return False
+    try:
+        with pa.memory_map(cache_path) as source:
+            metadata = pa.ipc.open_file(source).schema.metadata or {}
+    except (OSError, pa.ArrowInvalid):
+        return False
+    expected = _source_metadata(path)
+    return all(metadata.get(key) == value for key, value in expected.items())
+
+
+def _sort_dictionaries(table):
+    """Sort categorical dictionaries so groupby output stays in alphabetical order"""
+    for i, field in enumerate(table.schema):
+        if pa.types.is_dictionary(field.type):
+            values = table.column(i).cast(pa.string())
+            categories = pc.unique(values).sort()
+            indices = pc.index_in(values, value_set=categories).cast(pa.int32())
+            chunks = [pa.DictionaryArray.from_arrays(chunk, categories) for chunk in indices.chunks]
+            table = table.set_column(i, field.name, pa.chunked_array(chunks, type=field.type))
+    return table
+
+
+def read_csv_arrow(path=DATA_PATH):
+    """Parse a CSV into an Arrow table with the declared schema and sorted dictionaries"""
+    # include_columns makes a file missing any declared column fail instead of loading NaNs
+    convert_options = pa_csv.ConvertOptions(column_types=arrow_schema_types(), include_columns=list(SCHEMA))
+    table = pa_csv.read_csv(path, convert_options=convert_options)
+    return _sort_dictionaries(table).replace_schema_metadata(_source_metadata(path))
+
+
+@contextmanager
+def atomic_path(path):
+    """Yield a temporary path beside ``path`` that is renamed over it once the block completes
+    
+    Concurrent readers never see a partial file, and a failed write leaves
+    ``path`` untouched. The temporary is hidden and keeps the file's name and
+    extension, so format-by-extension writers work and directory scans skip it.
+    """
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = os.path.join(directory, f'.{uuid.uuid4().hex}.{os.path.basename(path)}')
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def write_feather_atomic(table, cache_path):
+    """Write an uncompressed Feather file via a temp file and rename"""
+    with atomic_path(cache_path) as tmp_path:
+        # Uncompressed so the file can be memory-mapped without decoding
+        feather.write_feather(table, tmp_path, compression='uncompressed')
+    return cache_path
+
+
+def prune_oldest(directory, keep, match):
+    """Remove all but the ``keep`` most recently written files in ``directory`` whose names satisfy ``match``"""
+    paths = [os.path.join(directory, name) for name in os.listdir(directory) if match(name)]
+    paths.sort(key=os.path.getmtime, reverse=True)
+    for path in paths[keep:]:
+        os.remove(path)
+
+
+def build_columnar_cache(path=DATA_PATH, cache_path=None):
+    """Parse the CSV once with the declared schema and write an uncompressed Feather file"""
+    return write_feather_atomic(read_csv_arrow(path), cache_path or columnar_cache_path(path))
+
+
+def read_columnar(cache_path, columns=None):
+    """Memory-map the Feather cache and expose it as a DataFrame"""
+    table = feather.read_table(cache_path, columns=columns, memory_map=True)
+    # split_blocks lets numeric columns stay zero-copy views of the mapped file
+    return table.to_pandas(split_blocks=True)
+
+
+def ensure_columnar_cache(path=DATA_PATH, cache_dir=CACHE_DIR):
+    """Return the path of an up-to-date columnar cache for the source, building it if needed"""
+    cache_path = columnar_cache_path(path, cache_dir)
+    if not cache_is_fresh(cache_path, path):
+        build_columnar_cache(path, cache_path)
+    return cache_path
+
+
+def source_files(path=DATA_PATH):
+    """CSV files behind a source: the file itself, or every visible CSV in a drop directory (sorted)"""
+    if not os.path.isdir(path):
+        return [path]
+    # Hidden files are partial writes (see atomic_path)
+    files = sorted(os.path.join(path, name) for name in os.listdir(path)
+                   if name.endswith('.csv') and not name.startswith('.'))
+    if not files:
+        raise FileNotFoundError(f"No CSV files in {path}")
+    return files
+
+
+def concat_typed(frames):
+    """Concatenate typed frames, unioning category dictionaries so categoricals survive"""
+    if len(frames) == 1:
+        return frames[0]
+    dtypes = {}
+    for col, dtype in SCHEMA.items():
+        if dtype == 'category' and col in frames[0].columns:
+            categories = sorted(set().union(*(frame[col].cat.categories for frame in frames)))
+            dtypes[col] = pd.CategoricalDtype(categories)
+    return pd.concat([frame.astype(dtypes) for frame in frames], ignore_index=True)
+
+
+def read_promo_data(path=DATA_PATH, cache_dir=CACHE_DIR, columns=None):
+    """Load the promo dataset, converting each CSV to the columnar cache on first use
+
+    ``path`` may be a directory of daily drops; every CSV in it is loaded
+    (each through its own cache, so only new files are parsed) and concatenated.
+    """
+    return concat_typed([read_columnar(ensure_columnar_cache(source, cache_dir), columns)
+                         for source in source_files(path)])
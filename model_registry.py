@@ -0,0 +1,79 @@
+"""On-disk registry of fitted uplift models keyed by training data fingerprint"""
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+from config import MODEL_DIR, MODEL_REGISTRY_MAX_ENTRIES
+
+# Bump when the pickled model layout changes so stale artefacts are refitted, not loaded
+MODEL_FORMAT_VERSION = '2'
+
+
+def fingerprint_frame(df, columns):
+    """Return a stable hash of the given columns of a DataFrame"""
+    hasher = hashlib.sha256()
+    hasher.update(json.dumps([(col, str(df[col].dtype)) for col in columns]).encode())
+    row_hashes = pd.util.hash_pandas_object(df[columns], index=False)
+    hasher.update(row_hashes.values.tobytes())
+    return hasher.hexdigest()
+
+
+def model_key(data_fingerprint, columns, params):
+    """Combine data fingerprint, training columns and hyperparameters into a registry key"""
+    import sklearn
+    
+    payload = json.dumps({
+        'data': data_fingerprint,
+        'columns': list(columns),
+        'params': params,
+        'sklearn': sklearn.__version__,
+        'format': MODEL_FORMAT_VERSION,
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def _model_path(key, model_dir):
+    return os.path.join(model_dir, f'uplift_model_{key}.joblib')
+
+
+def load_model(key, model_dir=MODEL_DIR):
+    """Load a persisted model entry, or return None if it is missing or unreadable"""
+    import joblib
+    
+    path = _model_path(key, model_dir)
+    if not os.path.exists(path):
+        return None
+    try:
+        return joblib.load(path)
+    except Exception:
+        # A corrupt or incompatible artefact is treated as a cache miss
+        return None
+
+
+def save_model(key, entry, model_dir=MODEL_DIR, max_entries=MODEL_REGISTRY_MAX_ENTRIES):
+    """Persist a model entry atomically and prune the oldest entries"""
+    import joblib
+    
+    from ingest import atomic_path
+    
+    with atomic_path(_model_path(key, model_dir)) as tmp_path:
+        joblib.dump(entry, tmp_path)
+    prune_models(model_dir, max_entries)
+
+
+def prune_models(model_dir=MODEL_DIR, max_entries=MODEL_REGISTRY_MAX_ENTRIES):
+    """Remove all but the most recently written models"""
+    from ingest import prune_oldest
+    prune_oldest(model_dir, max_entries, lambda name: name.startswith('uplift_model_') and name.endswith('.joblib'))
+
+
+def load_or_fit(df, columns, params, fit_fn, model_dir=MODEL_DIR):
+    """Return a fitted model entry from disk, fitting and persisting it on a miss"""
+    key = model_key(fingerprint_frame(df, columns), columns, params)
+    entry = load_model(key, model_dir)
+    if entry is None:
+        entry = fit_fn()
+        save_model(key, entry, model_dir)
+    return entry
@@ -0,0 +1,140 @@
+"""Per-stage wall time, cache and memory instrumentation with JSON and Prometheus export"""
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Cache outcomes recorded per stage; 'n/a' for stages that are not cached
+CACHE_STATES = ('hit', 'miss', 'n/a')
+
+
+def current_rss_mb():
+    """Resident set size of this process right now, in MB"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (OSError, ValueError):
+        # No /proc (e.g. macOS): fall back to the peak, which is an upper bound
+        return peak_rss_mb()
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and kilobytes elsewhere
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+class Profiler:
+    """Stage records for one run, plus process-wide totals for the Prometheus export"""
+    
+    # Totals survive across runs and sessions; keyed by (stage, cache state)
+    _totals = {}
+    _totals_lock = threading.Lock()
+    
+    def __init__(self):
+        self.records = []
+        self._active = []
+    
+    @contextmanager
+    def stage(self, name, cached=False):
+        """Time a block; cached stages count as hits unless ``mark_miss`` runs inside them"""
+        record = {'stage': name, 'cache': 'hit' if cached else 'n/a'}
+        self._active.append(record)
+        rss_before = current_rss_mb()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['wall_ms'] = round((time.perf_counter() - start) * 1000, 3)
+            record['rss_delta_mb'] = round(current_rss_mb() - rss_before, 3)
+            self._active.remove(record)
+            self.records.append(record)
+            self._accumulate(record)
+    
+    def mark_miss(self):
+        """Flag the innermost cached stage as recomputed (call from the cached function body)"""
+        for record in reversed(self._active):
+            if record['cache'] != 'n/a':
+                record['cache'] = 'miss'
+                return
+    
+    @classmethod
+    def _accumulate(cls, record):
+        """Fold one record into the process-wide totals"""
+        key = (record['stage'], record['cache'])
+        with cls._totals_lock:
+            calls, seconds, rss = cls._totals.get(key, (0, 0.0, 0.0))
+            cls._totals[key] = (calls + 1, seconds + record['wall_ms'] / 1000, record['rss_delta_mb'])
+    
+    def summary(self):
+        """Total wall time, RSS delta and cache outcomes for this run"""
+        return {
+            'total_ms': round(sum(r['wall_ms'] for r in self.records), 3),
+            'rss_delta_mb': round(sum(r['rss_delta_mb'] for r in self.records), 3),
+            'hits': sum(r['cache'] == 'hit' for r in self.records),
+            'misses': sum(r['cache'] == 'miss' for r in self.records),
+            'rss_mb': round(current_rss_mb(), 1),
+            'peak_rss_mb': round(peak_rss_mb(), 1),
+        }
+    
+    def to_json(self):
+        """This run's records and summary as a JSON document"""
+        return json.dumps({'timestamp': time.time(), 'summary': self.summary(), 'stages': self.records}, indent=2)
+    
+    @classmethod
+    def to_prometheus(cls):
+        """Process-wide totals in the Prometheus text exposition format"""
+        with cls._totals_lock:
+            totals = sorted(cls._totals.items())
+        lines = [
+            '# HELP promo_stage_calls_total Dashboard stage executions by cache outcome.',
+            '# TYPE promo_stage_calls_total counter',
+        ]
+        lines += [f'promo_stage_calls_total{{stage="{stage}",cache="{cache}"}} {calls}'
+                  for (stage, cache), (calls, _, _) in totals]
+        lines += [
+            '# HELP promo_stage_seconds_total Wall time spent in each dashboard stage.',
+            '# TYPE promo_stage_seconds_total counter',
+        ]
+        lines += [f'promo_stage_seconds_total{{stage="{stage}",cache="{cache}"}} {seconds:.6f}'
+                  for (stage, cache), (_, seconds, _) in totals]
+        lines += [
+            '# HELP promo_stage_rss_delta_megabytes RSS change during the latest run of each stage.',
+            '# TYPE promo_stage_rss_delta_megabytes gauge',
+        ]
+        lines += [f'promo_stage_rss_delta_megabytes{{stage="{stage}",cache="{cache}"}} {rss}'
+                  for (stage, cache), (_, _, rss) in totals]
+        lines += [
+            '# HELP promo_process_resident_megabytes Resident set size of the dashboard process.',
+            '# TYPE promo_process_resident_megabytes gauge',
+            f'promo_process_resident_megabytes {current_rss_mb():.1f}',
+        ]
+        return '\n'.join(lines) + '\n'
+    
+    @classmethod
+    def write_prometheus(cls, path):
+        """Atomically write the totals for a node-exporter style textfile collector"""
+        from ingest import atomic_path
+        
+        with atomic_path(path) as tmp_path, open(tmp_path, 'w') as out:
+            out.write(cls.to_prometheus())
+
+
+# Each Streamlit session runs its script on its own thread
+_local = threading.local()
+
+
+def start_run():
+    """Begin a fresh profiler for this thread's script run"""
+    _local.profiler = Profiler()
+    return _local.profiler
+
+
+def get_profiler():
+    """The profiler for the current thread's run"""
+    profiler = getattr(_local, 'profiler', None)
+    return profiler if profiler is not None else start_run()
@@ -1,17 +1,23 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import seaborn as sns
-import matplotlib.pyplot as plt
-from datetime import datetime, timedelta
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import LabelEncoder
-from sklearn.metrics import classification_report, confusion_matrix
+import os
+import time
 import warnings
+
+import uplift_core
+from config import (APPEND_MODE, BOOTSTRAP_CONFIDENCE, BOOTSTRAP_METHOD, BOOTSTRAP_REPLICATES,
+                    CHART_MAX_CATEGORIES, DATA_PATH, EVALUATION_MAX_TRAIN_ROWS, EVALUATION_TEST_FRACTION,
+                    EXPORT_MAX_DOWNLOAD_ROWS,
+                    PARALLEL_WORKERS, PROFILE_PROMETHEUS_PATH, QUERY_BACKEND,
+                    REFRESH_INTERVAL_SECONDS, STREAMING_MODE, UPLIFT_CACHE_MAX_BYTES, UPLIFT_CACHE_MAX_ENTRIES)
+from uplift_core import calculate_uplift_metrics
+from aggregate_cube import INCOME_BUCKET_WIDTH
+from result_cache import ResultCache, filter_state_key
+from bootstrap import bootstrap_uplift
+from profiling import Profiler, get_profiler, start_run
+from shared_store import appended_snapshot, load_snapshot, partitioned_snapshot, sql_snapshot, streamed_snapshot
+from refresher import SnapshotRefresher
+from allocation import TACTIC, allocate, allocation_moves, cell_uplift, max_useful_budget, summarise_plan
+from export import EXPORT_FORMATS, ROW_COLUMNS, export_file, export_path, iter_scores, iter_snapshot_rows, read_export
 warnings.filterwarnings('ignore')
 
 # Page configuration
@@ -107,91 +113,111 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-@st.cache_data
-def load_data():
-    """Load and preprocess the promotional uplift dataset"""
-    df = pd.read_csv('promo_uplift_enriched.csv')
-    
-    # Create additional features for analysis
-    # Adjust income bins based on actual data distribution
-    income_bins = [0, 30000, 50000, float('inf')]
-    income_labels = ['Low', 'Medium', 'High']
-    df['income_segment'] = pd.cut(df['income'], 
-                                 bins=income_bins, 
-                                 labels=income_labels)
-    
-    # Create age segments
-    df['age_segment'] = pd.cut(df['age'], 
-                              bins=[0, 25, 35, 50, 65, float('inf')], 
-                              labels=['18-25', '26-35', '36-50', '51-65', '65+'])
-    
-    return df
+# Rows shown in the debug panel's sample of filtered data
+DEBUG_SAMPLE_ROWS = 5
+# Initial campaign budget as a share of the spend that would fund every audience's best tactic
+DEFAULT_BUDGET_SHARE = 0.25
+# Segments and tactics listed on each recommendation card
+RECOMMENDATIONS_PER_CARD = 3
 
-@st.cache_data
-def calculate_customer_segments(df):
-    """Calculate customer segments based on behavior and demographics"""
-    # Create customer segments based on total spent and customer status
-    def create_segment(row):
-        if row['customer_status'] == 'New':
-            return 'New Customers'
-        elif row['customer_status'] == 'Lapsed':
-            return 'Lapsed Customers'
-        elif row['total_spent_last_month'] > 200:
-            return 'High-Value Existing'
-        else:
-            return 'Regular Existing'
-    
-    df['customer_segment'] = df.apply(create_segment, axis=1)
-    
-    return df
+def build_snapshot(path, signature):
+    """Load, segment and aggregate one version of the dataset"""
+    if STREAMING_MODE:
+        # Out-of-core: only the merged aggregates are kept, row-level panels are skipped
+        return streamed_snapshot(path, signature)
+    if QUERY_BACKEND != 'pandas':
+        # Rows stay in the embedded database; filters and roll-ups are pushed down as SQL
+        return sql_snapshot(path, signature, QUERY_BACKEND)
+    if APPEND_MODE and os.path.isdir(path):
+        # New drops are segmented and folded into the stored cube; history is not reprocessed
+        return appended_snapshot(path, signature)
+    if PARALLEL_WORKERS > 1:
+        # Workers bin, segment and aggregate partitions; results match the serial path
+        return partitioned_snapshot(path, signature)
+    return load_snapshot(path, signature)
+
+# One refresher per process; every session reads its current snapshot, which is
+# rebuilt in the background and swapped in when the source changes
+@st.cache_resource(show_spinner=False)
+def get_refresher(path):
+    """Start the snapshot refresher for a source (the first snapshot is built synchronously)"""
+    get_profiler().mark_miss()
+    return SnapshotRefresher(path, build_snapshot, REFRESH_INTERVAL_SECONDS).start()
 
-@st.cache_data
-def calculate_uplift_metrics(df):
-    """Calculate uplift metrics for promotional campaigns"""
-    # Calculate response rates by segment and promo exposure
-    uplift_analysis = df.groupby(['customer_segment', 'promo_exposed']).agg({
-        'purchase_made': ['mean', 'count'],
-        'basket_size': 'mean'
-    }).round(4)
-    
-    # Flatten column names
-    uplift_analysis.columns = ['response_rate', 'transaction_count', 'avg_basket_size']
-    uplift_analysis = uplift_analysis.reset_index()
-    
-    # Calculate uplift
-    uplift_pivot = uplift_analysis.pivot(index='customer_segment', 
-                                       columns='promo_exposed', 
-                                       values='response_rate').reset_index()
-    
-    uplift_pivot.columns = ['customer_segment', 'control_rate', 'treatment_rate']
-    uplift_pivot['uplift'] = uplift_pivot['treatment_rate'] - uplift_pivot['control_rate']
-    uplift_pivot['uplift_percentage'] = (uplift_pivot['uplift'] / uplift_pivot['control_rate'] * 100).round(2)
-    
-    return uplift_analysis, uplift_pivot
+@st.cache_resource(show_spinner=False)
+def get_uplift_cache():
+    """Process-wide LRU cache of uplift tables keyed by dataset version and filter state"""
+    return ResultCache(UPLIFT_CACHE_MAX_ENTRIES, UPLIFT_CACHE_MAX_BYTES)
 
-def create_uplift_model(df):
-    """Create uplift model using two-model approach"""
-    # Create features
-    features = ['age', 'income', 'total_spent_last_month', 'promo_exposed']
-    categorical_features = ['customer_segment', 'channel', 'product_category', 'customer_status', 'promo_type']
-    
-    # Encode categorical features
-    le = LabelEncoder()
-    for feature in categorical_features:
-        df[f'{feature}_encoded'] = le.fit_transform(df[feature].astype(str))
-        features.append(f'{feature}_encoded')
-    
-    # Split data
-    X = df[features]
-    y = df['purchase_made']
-    
-    # Train model
-    model = RandomForestClassifier(n_estimators=100, random_state=42)
-    model.fit(X, y)
-    
-    return model, features, df
+def filtered_uplift_metrics(cube, signature, selections, income_range):
+    """Uplift metrics with bootstrap intervals for the active filters, recomputed only for unseen filter states"""
+    def compute():
+        get_profiler().mark_miss()
+        segment_stats = cube.rollup(['customer_segment', 'promo_exposed'], selections, income_range)
+        uplift_analysis, uplift_pivot = calculate_uplift_metrics(segment_stats)
+        intervals = bootstrap_uplift(segment_stats, BOOTSTRAP_REPLICATES, BOOTSTRAP_CONFIDENCE, BOOTSTRAP_METHOD)
+        return uplift_analysis, uplift_pivot.merge(intervals, on='customer_segment', how='left')
+    
+    key = ('uplift', signature, filter_state_key(selections, income_range),
+           BOOTSTRAP_REPLICATES, BOOTSTRAP_CONFIDENCE, BOOTSTRAP_METHOD)
+    return get_uplift_cache().get_or_compute(key, compute)
+
+def filtered_chart_figures(cube, signature, selections, income_range, uplift_analysis, uplift_pivot):
+    """Chart figures for the active filters, rebuilt only for unseen filter states"""
+    def compute():
+        # Plotly loads on the first chart build so the header, filters and KPIs render before it
+        from charts import build_chart_figures
+        get_profiler().mark_miss()
+        return build_chart_figures(cube, uplift_analysis, uplift_pivot, selections, income_range,
+                                   CHART_MAX_CATEGORIES)
+    
+    key = ('charts', signature, filter_state_key(selections, income_range), CHART_MAX_CATEGORIES,
+           BOOTSTRAP_REPLICATES, BOOTSTRAP_CONFIDENCE, BOOTSTRAP_METHOD)
+    with get_profiler().stage('chart_figures', cached=True):
+        return get_uplift_cache().get_or_compute(key, compute)
+
+def filtered_allocation(cube, signature, selections, income_range):
+    """Cell uplift and hull moves for the active filters; only the budget fill runs on each rerun"""
+    def compute():
+        get_profiler().mark_miss()
+        cells = cell_uplift(cube, selections, income_range)
+        return cells, allocation_moves(cells)
+    
+    key = ('allocation', signature, filter_state_key(selections, income_range))
+    with get_profiler().stage('allocation_moves', cached=True):
+        return get_uplift_cache().get_or_compute(key, compute)
+
+def model_evaluation(snapshot, signature):
+    """Holdout Qini, AUUC and decile evaluation of the configured uplift model, once per dataset version"""
+    params = uplift_core.model_params()
+    
+    def compute():
+        # scikit-learn and Plotly load only once the evaluation panel is switched on
+        from charts import qini_figure, strip_template
+        from uplift_evaluation import holdout_evaluation
+        get_profiler().mark_miss()
+        evaluation = holdout_evaluation(snapshot.frame, params, EVALUATION_TEST_FRACTION,
+                                        max_train_rows=EVALUATION_MAX_TRAIN_ROWS)
+        return evaluation.summary, evaluation.deciles, strip_template(qini_figure(evaluation.curve))
+    
+    key = ('evaluation', signature, tuple(sorted(params.items())),
+           EVALUATION_TEST_FRACTION, EVALUATION_MAX_TRAIN_ROWS)
+    with get_profiler().stage('model_evaluation', cached=True):
+        return get_uplift_cache().get_or_compute(key, compute)
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def get_uplift_model(_snapshot, signature, params):
+    """Return the uplift model from memory or disk, fitting only when the data or parameters changed"""
+    # In memory the entry is keyed by the source signature and the hyperparameters (so a new
+    # tuned_params.json takes effect); on disk by a data fingerprint.
+    # Only called by panels that need the model, so scikit-learn loads on first use.
+    get_profiler().mark_miss()
+    return uplift_core.load_or_fit_uplift_model(_snapshot.frame, dict(params))
 
 def main():
+    # Every stage of this run records wall time, cache outcome and RSS delta
+    profiler = start_run()
+    
     # Header
     st.markdown('<h1 class="main-header">Retail Promo Uplift Dashboard</h1>', unsafe_allow_html=True)
     st.markdown("### Advanced Causal Analysis for Marketing Campaign Optimisation")
@@ -199,116 +225,148 @@ def main():
     # Load data
     with st.spinner("Loading and processing data..."):
         try:
-            df = load_data()
-            if df is None:
-                st.error("Failed to load data. Please check if 'promo_uplift_enriched.csv' exists.")
-                return
-                
-            df = calculate_customer_segments(df)
-            if df is None:
-                st.error("Failed to calculate customer segments.")
-                return
-                
-            uplift_analysis, uplift_pivot = calculate_uplift_metrics(df)
-            if uplift_analysis is None or uplift_pivot is None:
-                st.error("Failed to calculate uplift metrics.")
-                return
-                
-            model, features, df_with_model = create_uplift_model(df)
-            if model is None:
-                st.error("Failed to create uplift model.")
-                return
-                
+            with profiler.stage('snapshot', cached=True):
+                refresher = get_refresher(DATA_PATH)
+                snapshot = refresher.current()
+            # Caches below are keyed by the version of the snapshot being served
+            signature = snapshot.signature
+            # Sessions share the snapshot's buffers; rows are only read through views of them
+            has_rows = snapshot.has_rows
+            cube = snapshot.cube
+            filter_index = snapshot.filter_index
+        
         except Exception as e:
             st.error(f"Error during data processing: {e}")
             return
     
     # Sidebar for filters
     st.sidebar.header("Dashboard Filters")
+    # Filter options come from the row index, or from the cube when there are no rows
+    filter_options = filter_index if filter_index is not None else cube
     
     # Income range filter
-    income_min = max(0, int(df['income'].min()))  # Ensure minimum is not negative
-    income_max = int(df['income'].max())
+    if filter_index is not None:
+        income_bounds = filter_index.range_bounds()
+    else:
+        income_bounds = cube.income_bounds()
+    # Bounds snap to the cube's income buckets so every slider position is a bucket edge; the range
+    # is half-open, so the maximum is the edge above the highest income. The minimum is never negative
+    income_min = max(0, int(income_bounds[0] // INCOME_BUCKET_WIDTH * INCOME_BUCKET_WIDTH))
+    income_max = int((income_bounds[1] // INCOME_BUCKET_WIDTH + 1) * INCOME_BUCKET_WIDTH)
     income_range = st.sidebar.slider(
         "Income Range (£)",
         min_value=income_min,
         max_value=income_max,
-        value=(income_min, income_max)
+        value=(income_min, income_max),
+        step=INCOME_BUCKET_WIDTH
     )
     
     # Customer segment filter
     st.sidebar.subheader("Customer Segments")
-    segment_options = ["All"] + list(df['customer_segment'].unique())
-    selected_segments = st.sidebar.selectbox(
+    segment_options = ["All"] + filter_options.values('customer_segment')
+    segment_choice = st.sidebar.selectbox(
         "Select segments",
         options=segment_options,
         index=0,
         label_visibility="collapsed"
     )
-    selected_segments = list(df['customer_segment'].unique()) if selected_segments == "All" else [selected_segments]
+    selected_segments = filter_options.values('customer_segment') if segment_choice == "All" else [segment_choice]
     
     # Channel filter
     st.sidebar.subheader("Channels")
-    channel_options = ["All"] + list(df['channel'].unique())
-    selected_channels = st.sidebar.selectbox(
+    channel_options = ["All"] + filter_options.values('channel')
+    channel_choice = st.sidebar.selectbox(
         "Select channels",
         options=channel_options,
         index=0,
         label_visibility="collapsed"
     )
-    selected_channels = list(df['channel'].unique()) if selected_channels == "All" else [selected_channels]
+    selected_channels = filter_options.values('channel') if channel_choice == "All" else [channel_choice]
     
     # Promo type filter
     st.sidebar.subheader("Promo Types")
-    promo_options = ["All"] + list(df['promo_type'].unique())
-    selected_promo_types = st.sidebar.selectbox(
+    promo_options = ["All"] + filter_options.values('promo_type')
+    promo_choice = st.sidebar.selectbox(
         "Select promo types",
         options=promo_options,
         index=0,
         label_visibility="collapsed"
     )
-    selected_promo_types = list(df['promo_type'].unique()) if selected_promo_types == "All" else [selected_promo_types]
+    selected_promo_types = filter_options.values('promo_type') if promo_choice == "All" else [promo_choice]
     
     # Product category filter
     st.sidebar.subheader("Product Categories")
-    category_options = ["All"] + list(df['product_category'].unique())
-    selected_categories = st.sidebar.selectbox(
+    category_options = ["All"] + filter_options.values('product_category')
+    category_choice = st.sidebar.selectbox(
         "Select categories",
         options=category_options,
         index=0,
         label_visibility="collapsed"
     )
-    selected_categories = list(df['product_category'].unique()) if selected_categories == "All" else [selected_categories]
-    
-    # Apply filters
-    filtered_df = df[
-        (df['channel'].isin(selected_channels)) &
-        (df['customer_segment'].isin(selected_segments)) &
-        (df['promo_type'].isin(selected_promo_types)) &
-        (df['product_category'].isin(selected_categories)) &
-        (df['income'] >= income_range[0]) &
-        (df['income'] <= income_range[1])
-    ]
+    selected_categories = filter_options.values('product_category') if category_choice == "All" else [category_choice]
+    
+    # Apply filters: intersect precomputed row sets, a no-op when everything is "All"
+    selections = {
+        'channel': channel_choice,
+        'customer_segment': segment_choice,
+        'promo_type': promo_choice,
+        'product_category': category_choice,
+    }
+    with profiler.stage('filtering'):
+        if filter_index is not None:
+            row_positions = filter_index.select(selections, income_range)
+            # Only the debug sample is materialised; KPIs and charts come from the cube
+            filtered_df = snapshot.head(row_positions, DEBUG_SAMPLE_ROWS)
+        elif QUERY_BACKEND != 'pandas':
+            # Only the debug sample is fetched as rows; counts and breakdowns are SQL aggregates
+            filtered_df = cube.select_rows(selections, income_range, limit=DEBUG_SAMPLE_ROWS)
+        else:
+            filtered_df = None
+    
+    # KPIs and breakdowns are rolled up from the cube rather than the rows
+    with profiler.stage('groupby:totals'):
+        filtered_totals = cube.totals(selections, income_range)
+        overall_totals = cube.totals()
+    filtered_count = int(filtered_totals['count'])
+    total_count = int(overall_totals['count'])
+    
+    # Uplift follows the sidebar too; repeated filter states are served from the LRU cache
+    try:
+        with profiler.stage('calculate_uplift_metrics', cached=True):
+            uplift_analysis, uplift_pivot = filtered_uplift_metrics(cube, signature, selections, income_range)
+    except Exception as e:
+        st.error(f"Failed to calculate uplift metrics: {e}")
+        return
     
     # Check if filtered_df is empty
-    if len(filtered_df) == 0:
+    if filtered_count == 0:
         st.error("No data matches the selected filters. Please adjust your filter criteria.")
-        st.write(f"Debug info: Total records: {len(df)}, Selected channels: {selected_channels}, Selected segments: {selected_segments}")
+        st.write(f"Debug info: Total records: {total_count}, Selected channels: {selected_channels}, "
+                 f"Selected segments: {selected_segments}")
         return
     
     # Debug information (hidden by default)
     with st.expander("Debug Information"):
-        st.write(f"Total records in dataset: {len(df)}")
-        st.write(f"Filtered records: {len(filtered_df)}")
+        st.write(f"Total records in dataset: {total_count}")
+        st.write(f"Shared snapshot: {snapshot.nbytes / 1024 ** 2:.1f} MB of rows, held once for all sessions")
+        st.write(f"Snapshot built: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(snapshot.created_at))} "
+                 f"({refresher.refreshes} build(s) since start)")
+        if refresher.last_error:
+            st.write(f"Last refresh failed, still serving the previous snapshot: {refresher.last_error}")
+        st.write(f"Filtered records: {filtered_count}")
         st.write(f"Selected channels: {selected_channels}")
         st.write(f"Selected segments: {selected_segments}")
         st.write(f"Selected promo types: {selected_promo_types}")
         st.write(f"Selected categories: {selected_categories}")
         st.write(f"Income range: £{income_range[0]:,} - £{income_range[1]:,}")
         
-        # Show sample of filtered data
-        st.write("Sample of filtered data:")
-        st.dataframe(filtered_df.head())
+        if filtered_df is not None:
+            # Show sample of filtered data
+            st.write("Sample of filtered data:")
+            st.dataframe(filtered_df)
+        else:
+            st.write("Streaming mode: row-level sample unavailable. Stream statistics:")
+            st.json(snapshot.stream_report.as_dict())
     
     # Filter summary and clear button
     st.sidebar.markdown("---")
@@ -316,13 +374,13 @@ def main():
     # Show filter summary
     col1, col2 = st.sidebar.columns([2, 1])
     with col1:
-        st.metric("Filtered Records", f"{len(filtered_df):,}")
+        st.metric("Filtered Records", f"{filtered_count:,}")
     with col2:
-        st.metric("Total Records", f"{len(df):,}")
+        st.metric("Total Records", f"{total_count:,}")
     
     # Filter summary
-    if len(filtered_df) < len(df):
-        st.sidebar.info(f"Showing {len(filtered_df):,} of {len(df):,} records")
+    if filtered_count < total_count:
+        st.sidebar.info(f"Showing {filtered_count:,} of {total_count:,} records")
     else:
         st.sidebar.success("Showing all records")
     
@@ -336,14 +394,14 @@ def main():
     with col1:
         st.metric(
             "Total Transactions",
-            f"{len(filtered_df):,}",
-            delta=f"{len(filtered_df) - len(df):,}" if len(filtered_df) != len(df) else None
+            f"{filtered_count:,}",
+            delta=f"{filtered_count - total_count:,}" if filtered_count != total_count else None
         )
     
     with col2:
         try:
-            promo_rate = round(filtered_df['promo_exposed'].mean() * 100, 1)
-            overall_promo_rate = round(df['promo_exposed'].mean() * 100, 1)
+            promo_rate = round(filtered_totals['exposed_count'] / filtered_totals['count'] * 100, 1)
+            overall_promo_rate = round(overall_totals['exposed_count'] / overall_totals['count'] * 100, 1)
             delta_value = promo_rate - overall_promo_rate
             st.metric(
                 "Promo Exposure Rate",
@@ -355,8 +413,8 @@ def main():
     
     with col3:
         try:
-            response_rate = round(filtered_df['purchase_made'].mean() * 100, 1)
-            overall_response_rate = round(df['purchase_made'].mean() * 100, 1)
+            response_rate = round(filtered_totals['purchase_sum'] / filtered_totals['count'] * 100, 1)
+            overall_response_rate = round(overall_totals['purchase_sum'] / overall_totals['count'] * 100, 1)
             delta_value = response_rate - overall_response_rate
             st.metric(
                 "Overall Response Rate",
@@ -368,8 +426,8 @@ def main():
     
     with col4:
         try:
-            avg_basket = filtered_df['basket_size'].mean()
-            overall_basket = df['basket_size'].mean()
+            avg_basket = filtered_totals['basket_sum'] / filtered_totals['count']
+            overall_basket = overall_totals['basket_sum'] / overall_totals['count']
             delta_value = avg_basket - overall_basket
             st.metric(
                 "Avg Basket Size",
@@ -383,36 +441,59 @@ def main():
     st.markdown("---")
     st.subheader("Key Insights")
     
-    # Calculate insights with error handling
-    try:
-        best_uplift_segment = uplift_pivot.loc[uplift_pivot['uplift_percentage'].idxmax()]
-        worst_uplift_segment = uplift_pivot.loc[uplift_pivot['uplift_percentage'].idxmin()]
-    except Exception as e:
-        st.error(f"Error calculating insights: {e}")
-        return
-    
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        st.markdown(f"""
-        <div class="insight-box">
-        <h4>Best Performing Segment</h4>
-        <p><strong>{best_uplift_segment['customer_segment']}</strong> shows the highest uplift at 
-        <strong>{best_uplift_segment['uplift_percentage']}%</strong> when exposed to promotions.</p>
-        <p><em>Recommendation: Prioritise this segment for targeted campaigns.</em></p>
-        </div>
-        """, unsafe_allow_html=True)
+    # Segments missing a control or treatment group under the filters have no uplift
+    ranked_segments = uplift_pivot.dropna(subset=['uplift_percentage'])
+    confidence_pct = f"{BOOTSTRAP_CONFIDENCE:.0%}"
     
-    with col2:
-        st.markdown(f"""
-        <div class="insight-box">
-        <h4>Segment Needing Attention</h4>
-        <p><strong>{worst_uplift_segment['customer_segment']}</strong> shows only 
-        <strong>{worst_uplift_segment['uplift_percentage']}%</strong> uplift, suggesting 
-        different promotional strategies may be needed.</p>
-        <p><em>Action: Review current approach and test alternative strategies.</em></p>
-        </div>
-        """, unsafe_allow_html=True)
+    if ranked_segments.empty:
+        st.info("No segment has both control and treatment customers under these filters, "
+                "so segment insights are unavailable.")
+    else:
+        # Only recommend a segment whose uplift interval excludes zero
+        significant_segments = ranked_segments[ranked_segments['significant'] & (ranked_segments['uplift'] > 0)]
+        best_uplift_segment = (significant_segments.loc[significant_segments['uplift_percentage'].idxmax()]
+                               if len(significant_segments) else None)
+        worst_uplift_segment = ranked_segments.loc[ranked_segments['uplift_percentage'].idxmin()]
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            if best_uplift_segment is not None:
+                st.markdown(f"""
+                <div class="insight-box">
+                <h4>Best Performing Segment</h4>
+                <p><strong>{best_uplift_segment['customer_segment']}</strong> shows the highest significant uplift at
+                <strong>{best_uplift_segment['uplift_percentage']}%</strong> when exposed to promotions
+                ({confidence_pct} CI {best_uplift_segment['uplift_pct_ci_low']}% to
+                {best_uplift_segment['uplift_pct_ci_high']}%).</p>
+                <p><em>Recommendation: Prioritise this segment for targeted campaigns.</em></p>
+                </div>
+                """, unsafe_allow_html=True)
+            else:
+                st.markdown(f"""
+                <div class="insight-box">
+                <h4>Best Performing Segment</h4>
+                <p>No segment shows a statistically significant positive uplift at the {confidence_pct} level
+                under the current filters.</p>
+                <p><em>Recommendation: Widen the filters or collect more data before targeting.</em></p>
+                </div>
+                """, unsafe_allow_html=True)
+        
+        with col2:
+            st.markdown(f"""
+            <div class="insight-box">
+            <h4>Segment Needing Attention</h4>
+            <p><strong>{worst_uplift_segment['customer_segment']}</strong> shows only
+            <strong>{worst_uplift_segment['uplift_percentage']}%</strong> uplift
+            ({confidence_pct} CI {worst_uplift_segment['uplift_pct_ci_low']}% to
+            {worst_uplift_segment['uplift_pct_ci_high']}%), suggesting different promotional strategies
+            may be needed.</p>
+            <p><em>Action: Review current approach and test alternative strategies.</em></p>
+            </div>
+            """, unsafe_allow_html=True)
+    
+    # Figures are built from the cube in one pass each and cached per filter state
+    chart_figures = filtered_chart_figures(cube, signature, selections, income_range, uplift_analysis, uplift_pivot)
     
     # Uplift Analysis Charts
     st.markdown("---")
@@ -421,50 +502,12 @@ def main():
     col1, col2 = st.columns(2)
     
     with col1:
-        # Uplift by segment chart
-        fig_uplift = px.bar(
-            uplift_pivot,
-            x='customer_segment',
-            y='uplift_percentage',
-            title='Promotional Uplift by Customer Segment',
-            color='uplift_percentage',
-            color_continuous_scale='RdYlGn'
-        )
-        fig_uplift.update_layout(
-            xaxis_title="Customer Segment",
-            yaxis_title="Uplift Percentage (%)",
-            showlegend=False
-        )
-        st.plotly_chart(fig_uplift, use_container_width=True)
+        # Uplift by segment chart, with bootstrap intervals as error bars
+        st.plotly_chart(chart_figures['uplift'], use_container_width=True)
     
     with col2:
         # Response rates comparison
-        fig_response = go.Figure()
-        
-        for segment in uplift_pivot['customer_segment']:
-            segment_data = uplift_analysis[uplift_analysis['customer_segment'] == segment]
-            
-            fig_response.add_trace(go.Bar(
-                name=f'{segment} - Control',
-                x=[segment],
-                y=segment_data[segment_data['promo_exposed'] == 0]['response_rate'],
-                marker_color='lightblue'
-            ))
-            
-            fig_response.add_trace(go.Bar(
-                name=f'{segment} - Treatment',
-                x=[segment],
-                y=segment_data[segment_data['promo_exposed'] == 1]['response_rate'],
-                marker_color='darkblue'
-            ))
-        
-        fig_response.update_layout(
-            title='Response Rates: Control vs Treatment',
-            xaxis_title="Customer Segment",
-            yaxis_title="Response Rate",
-            barmode='group'
-        )
-        st.plotly_chart(fig_response, use_container_width=True)
+        st.plotly_chart(chart_figures['response'], use_container_width=True)
     
     # Channel and Product Analysis
     st.markdown("---")
@@ -474,71 +517,17 @@ def main():
     
     with col1:
         # Channel effectiveness
-        channel_analysis = filtered_df.groupby(['channel', 'promo_exposed']).agg({
-            'purchase_made': 'mean',
-            'basket_size': 'mean'
-        }).reset_index()
-        
-        fig_channel = px.bar(
-            channel_analysis,
-            x='channel',
-            y='purchase_made',
-            color='promo_exposed',
-            title='Response Rate by Channel',
-            barmode='group'
-        )
-        fig_channel.update_layout(
-            xaxis_title="Channel",
-            yaxis_title="Response Rate"
-        )
-        st.plotly_chart(fig_channel, use_container_width=True)
+        st.plotly_chart(chart_figures['channel'], use_container_width=True)
     
     with col2:
         # Product category analysis
-        category_analysis = filtered_df.groupby(['product_category', 'promo_exposed']).agg({
-            'purchase_made': 'mean',
-            'basket_size': 'mean'
-        }).reset_index()
-        
-        fig_category = px.bar(
-            category_analysis,
-            x='product_category',
-            y='basket_size',
-            color='promo_exposed',
-            title='Average Basket Size by Product Category',
-            barmode='group'
-        )
-        fig_category.update_layout(
-            xaxis_title="Product Category",
-            yaxis_title="Average Basket Size (£)"
-        )
-        st.plotly_chart(fig_category, use_container_width=True)
+        st.plotly_chart(chart_figures['category'], use_container_width=True)
     
     # Customer Status Analysis
     st.markdown("---")
     st.subheader("Customer Status Performance")
     
-    status_analysis = filtered_df.groupby(['customer_status', 'promo_exposed']).agg({
-        'purchase_made': 'mean',
-        'basket_size': 'mean',
-        'customer_id': 'count'
-    }).reset_index()
-    
-    fig_status = px.scatter(
-        status_analysis,
-        x='purchase_made',
-        y='basket_size',
-        size='customer_id',
-        color='customer_status',
-        symbol='promo_exposed',
-        title='Customer Status Performance: Response Rate vs Basket Size',
-        hover_data=['customer_status', 'promo_exposed']
-    )
-    fig_status.update_layout(
-        xaxis_title="Response Rate",
-        yaxis_title="Average Basket Size (£)"
-    )
-    st.plotly_chart(fig_status, use_container_width=True)
+    st.plotly_chart(chart_figures['status'], use_container_width=True)
     
     # Detailed Uplift Table
     st.markdown("---")
@@ -546,7 +535,8 @@ def main():
     
     # Create detailed table
     detailed_uplift = uplift_analysis.merge(
-        uplift_pivot[['customer_segment', 'uplift', 'uplift_percentage']], 
+        uplift_pivot[['customer_segment', 'uplift', 'uplift_ci_low', 'uplift_ci_high', 'uplift_percentage',
+                      'uplift_pct_ci_low', 'uplift_pct_ci_high', 'p_value', 'significant']],
         on='customer_segment'
     )
     
@@ -556,35 +546,174 @@ def main():
         hide_index=True
     )
     
-    # Actionable Recommendations
+    # Model evaluation is opt-in: it fits on a training split, so it stays off the default rerun path
+    st.markdown("---")
+    st.subheader("Uplift Model Evaluation")
+    if st.checkbox("Evaluate the uplift model on held-out customers (Qini / AUUC)"):
+        if not has_rows:
+            st.info("Model evaluation needs row-level data, which this backend does not keep in memory.")
+        else:
+            with st.spinner("Fitting on the training split and scoring held-out customers..."):
+                evaluation_summary, deciles, qini_fig = model_evaluation(snapshot, signature)
+            st.caption(f"Unfiltered data: {int(evaluation_summary['rows']):,} held-out customers "
+                       f"({EVALUATION_TEST_FRACTION:.0%} of rows)")
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Qini Coefficient", f"{evaluation_summary['qini_coefficient']:.4f}")
+            col2.metric("AUUC", f"{evaluation_summary['auuc']:.4f}",
+                        f"{evaluation_summary['auuc'] - evaluation_summary['random_auuc']:+.4f} vs random")
+            col3.metric("Incremental Purchases", f"{evaluation_summary['incremental_purchases']:,.0f}")
+            
+            col1, col2 = st.columns(2)
+            with col1:
+                st.plotly_chart(qini_fig, use_container_width=True)
+            with col2:
+                st.write("Uplift by score decile (1 = highest predicted uplift)")
+                st.dataframe(deciles.round(4), use_container_width=True, hide_index=True)
+    
+    # Actionable Recommendations: the spend plan is re-solved from cached hull moves as the budget moves
     st.markdown("---")
     st.subheader("Actionable Marketing Recommendations")
     
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        st.markdown("""
-        <div class="metric-card">
-        <h4>High-Impact Segments</h4>
-        <ul>
-        <li>Prioritise Lapsed Customers (152% uplift) with re-engagement campaigns</li>
-        <li>Target New Customers (125% uplift) with welcome promotions</li>
-        <li>Develop premium strategies for High-Value Existing customers</li>
-        </ul>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with col2:
-        st.markdown("""
-        <div class="metric-card">
-        <h4>Channel & Promo Strategy</h4>
-        <ul>
-        <li>Use SMS for high-income customers and urgent promotions</li>
-        <li>Leverage Email for existing customer relationship building</li>
-        <li>Test BOGO offers for New customers to increase basket size</li>
-        </ul>
-        </div>
-        """, unsafe_allow_html=True)
+    cells, moves = filtered_allocation(cube, signature, selections, income_range)
+    max_budget = max_useful_budget(moves)
+    plan = None
+    if max_budget <= 0:
+        st.info("No segment, channel and promo combination shows positive uplift under the current filters, "
+                "so no promotional spend is recommended.")
+    else:
+        budget_max = int(max_budget) + 1
+        budget = st.slider(
+            "Campaign Budget (£)",
+            min_value=0,
+            max_value=budget_max,
+            value=int(budget_max * DEFAULT_BUDGET_SHARE),
+            step=max(1, budget_max // 100)
+        )
+        with profiler.stage('allocation'):
+            plan = allocate(cells, moves, budget)
+            segment_plan = summarise_plan(plan, ['customer_segment'])
+            tactic_plan = summarise_plan(plan, TACTIC)
+        
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Planned Spend", f"£{plan['spend'].sum():,.0f}")
+        col2.metric("Customers Contacted", f"{plan['customers'].sum():,}")
+        col3.metric("Expected Incremental Purchases", f"{plan['incremental_purchases'].sum():,.1f}")
+        if plan['incremental_purchases'].sum() > 0:
+            col4.metric("Cost per Incremental Purchase",
+                        f"£{plan['spend'].sum() / plan['incremental_purchases'].sum():,.2f}")
+        
+        if plan.empty:
+            st.info("Raise the budget to see which customers to contact first.")
+        else:
+            # Each tactic's largest cell says who it should be aimed at
+            top_cells = plan.drop_duplicates(TACTIC).set_index(TACTIC)
+            segment_items = "".join(
+                f"<li>Prioritise {row.customer_segment}: {row.customers:,} contacts for £{row.spend:,.0f}, "
+                f"+{row.incremental_purchases:,.1f} expected purchases "
+                f"({row.uplift_per_contact:.1%} uplift per contact)</li>"
+                for row in segment_plan.head(RECOMMENDATIONS_PER_CARD).itertuples()
+            )
+            tactic_items = "".join(
+                f"<li>{row.promo_type} via {row.channel}: {row.spend / plan['spend'].sum():.0%} of spend, "
+                f"best aimed at "
+                f"{top_cells.loc[(row.channel, row.promo_type), 'customer_segment']} buying "
+                f"{top_cells.loc[(row.channel, row.promo_type), 'product_category']}</li>"
+                for row in tactic_plan.head(RECOMMENDATIONS_PER_CARD).itertuples()
+            )
+            
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                st.markdown(f"""
+                <div class="metric-card">
+                <h4>High-Impact Segments</h4>
+                <ul>
+                {segment_items}
+                </ul>
+                </div>
+                """, unsafe_allow_html=True)
+            
+            with col2:
+                st.markdown(f"""
+                <div class="metric-card">
+                <h4>Channel & Promo Strategy</h4>
+                <ul>
+                {tactic_items}
+                </ul>
+                </div>
+                """, unsafe_allow_html=True)
+            
+            with st.expander("Allocation Plan"):
+                st.dataframe(plan.round(4), use_container_width=True, hide_index=True)
+    
+    # Exports are written in chunks only when a download is clicked, on the download's own thread
+    with st.expander("Export Data"):
+        export_options = ["Filtered rows", "Uplift scores", "Detailed uplift metrics"]
+        if plan is not None and not plan.empty:
+            export_options.append("Allocation plan")
+        export_choice = st.selectbox("Dataset", export_options)
+        export_format = st.radio("Format", list(EXPORT_FORMATS), horizontal=True)
+        filter_key = filter_state_key(selections, income_range)
+        
+        make_chunks, export_rows = None, filtered_count
+        if export_choice == "Filtered rows":
+            export_columns = st.multiselect("Columns", ROW_COLUMNS, default=ROW_COLUMNS)
+            if export_columns:
+                export_key = (signature, filter_key, tuple(export_columns))
+                make_chunks = lambda: iter_snapshot_rows(snapshot, selections, income_range, export_columns)
+        elif export_choice == "Uplift scores":
+            if not has_rows:
+                st.info("Scoring needs row-level data to fit the model, which this backend does not keep in memory.")
+            else:
+                with st.spinner("Loading the uplift model..."), profiler.stage('create_uplift_model', cached=True):
+                    model, _ = get_uplift_model(snapshot, signature,
+                                                tuple(sorted(uplift_core.model_params().items())))
+                export_key = (signature, filter_key, model.learner, tuple(sorted(model.params.items())))
+                make_chunks = lambda: iter_scores(model, iter_snapshot_rows(snapshot, selections, income_range))
+        elif export_choice == "Detailed uplift metrics":
+            export_key = (signature, filter_key, BOOTSTRAP_REPLICATES, BOOTSTRAP_CONFIDENCE, BOOTSTRAP_METHOD)
+            make_chunks, export_rows = lambda: [detailed_uplift], len(detailed_uplift)
+        else:
+            export_key = (signature, filter_key, budget)
+            make_chunks, export_rows = lambda: [plan], len(plan)
+        
+        if make_chunks is not None:
+            name = export_choice.lower().replace(' ', '_')
+            path = export_path(name, export_key, export_format)
+            if export_rows <= EXPORT_MAX_DOWNLOAD_ROWS:
+                st.caption(f"{export_rows:,} rows, written in chunks to `{path}` when downloaded")
+                st.download_button(f"Download {export_format.upper()}",
+                                   lambda: read_export(export_file(path, make_chunks)),
+                                   file_name=f"promo_{name}.{export_format}", mime=EXPORT_FORMATS[export_format])
+            else:
+                # A browser download would hold the whole file in server memory; larger exports stay on disk
+                st.caption(f"{export_rows:,} rows is above the {EXPORT_MAX_DOWNLOAD_ROWS:,}-row download limit "
+                           f"(PROMO_EXPORT_MAX_DOWNLOAD_ROWS), so the export is written on the server")
+                if st.button(f"Write {export_format.upper()} to disk"):
+                    with st.spinner("Writing the export in chunks..."), profiler.stage('export'):
+                        export_file(path, make_chunks)
+                    st.success(f"Export written to `{os.path.abspath(path)}`")
+    
+    # Performance profile for this run (hidden by default)
+    with st.expander("Performance Profile"):
+        summary = profiler.summary()
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Instrumented Time", f"{summary['total_ms']:.1f} ms")
+        col2.metric("Cache Hits / Misses", f"{summary['hits']} / {summary['misses']}")
+        col3.metric("RSS Change", f"{summary['rss_delta_mb']:+.1f} MB")
+        col4.metric("Process RSS", f"{summary['rss_mb']:.0f} MB")
+        st.dataframe(profiler.records, use_container_width=True, hide_index=True)
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button("Download JSON", profiler.to_json(), file_name="promo_profile.json",
+                               mime="application/json")
+        with col2:
+            st.download_button("Download Prometheus metrics", Profiler.to_prometheus(),
+                               file_name="promo_profile.prom", mime="text/plain")
+    
+    if PROFILE_PROMETHEUS_PATH:
+        Profiler.write_prometheus(PROFILE_PROMETHEUS_PATH)
     
     # Footer
     st.markdown("---")
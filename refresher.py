@@ -0,0 +1,108 @@
+"""Stale-while-revalidate refresh of dataset snapshots in a background thread"""
+import logging
+import threading
+import time
+
+from config import REFRESH_INTERVAL_SECONDS, REFRESH_WARM_MODEL
+from uplift_core import source_signature
+
+logger = logging.getLogger(__name__)
+
+
+def warm_uplift_model(snapshot):
+    """Fit or load the uplift model for a snapshot so the registry holds it before sessions ask"""
+    if not snapshot.has_rows:
+        return
+    from uplift_core import load_or_fit_uplift_model
+    load_or_fit_uplift_model(snapshot.frame)
+
+
+class SnapshotRefresher:
+    """Serve the latest completed snapshot while a worker thread rebuilds on source changes
+    
+    ``build(path, signature)`` creates a snapshot. The first one is built
+    synchronously; afterwards a daemon thread checks the source signature every
+    ``interval`` seconds. Once a change has held for two checks the new snapshot
+    is built and warmed off the request path and swapped in atomically, so
+    sessions keep reading the previous version until the new one is complete.
+    A failed rebuild is logged and the previous snapshot stays in service. With
+    ``interval`` of 0 no thread is started and ``current`` checks the source
+    synchronously instead.
+    """
+    
+    def __init__(self, path, build, interval=REFRESH_INTERVAL_SECONDS, warm=REFRESH_WARM_MODEL):
+        self.path = path
+        self.interval = interval
+        self.last_checked = None
+        self.last_error = None
+        self.refreshes = 0
+        self._build = build
+        self._warmers = [warm_uplift_model] if warm else []
+        self._snapshot = None
+        self._pending = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        """Build the first snapshot now and begin watching the source"""
+        self.refresh()
+        if self.interval > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='snapshot-refresher', daemon=True)
+            self._thread.start()
+        return self
+    
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+    
+    def current(self):
+        """The snapshot sessions should read right now"""
+        if self._thread is None and self.interval <= 0:
+            self.refresh()
+        return self._snapshot
+    
+    def refresh(self, warm=False, settle=False):
+        """Rebuild if the source changed; returns True when a new snapshot was swapped in
+        
+        With ``settle`` a change is only acted on once the same signature is seen
+        on two consecutive checks, so a file still being copied in is not loaded.
+        """
+        # One rebuild at a time; readers never wait on this lock
+        with self._lock:
+            self.last_checked = time.time()
+            signature = source_signature(self.path)
+            if self._snapshot is not None and self._snapshot.signature == signature:
+                return False
+            if settle and signature != self._pending:
+                self._pending = signature
+                return False
+            snapshot = self._build(self.path, signature)
+            if warm:
+                self._warm(snapshot)
+            # A single reference assignment: readers see the old or the new snapshot, never a mix
+            self._snapshot = snapshot
+            self.refreshes += 1
+            return True
+    
+    def _warm(self, snapshot):
+        for warmer in self._warmers:
+            warmer(snapshot)
+    
+    def _run(self):
+        # The first snapshot was served cold; warm it here rather than on the request path
+        try:
+            self._warm(self._snapshot)
+        except Exception as e:
+            self.last_error = repr(e)
+            logger.exception("Warming the initial snapshot failed")
+        while not self._stop.wait(self.interval):
+            try:
+                self.refresh(warm=True, settle=True)
+                self.last_error = None
+            except Exception as e:
+                # Keep serving the previous snapshot; the next tick retries
+                self.last_error = repr(e)
+                logger.exception("Snapshot refresh of %s failed", self.path)
@@ -0,0 +1,83 @@
+"""Bounded, thread-safe LRU cache for results keyed by filter state"""
+import sys
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from filter_index import is_unfiltered
+
+
+def estimate_nbytes(value):
+    """Approximate memory held by a cached value"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    # Containers that know their own size (e.g. charts.FigureSet) report it
+    if getattr(value, 'nbytes', None) is not None:
+        return int(value.nbytes)
+    if isinstance(value, (tuple, list)):
+        return sum(estimate_nbytes(item) for item in value)
+    if isinstance(value, dict):
+        return sum(estimate_nbytes(item) for item in value.values())
+    return sys.getsizeof(value)
+
+
+def filter_state_key(selections, income_range=None):
+    """Canonical, hashable form of a filter state ("All" and missing filters are equivalent)"""
+    active = []
+    for dim, selection in sorted(selections.items()):
+        if not is_unfiltered(selection):
+            values = selection if isinstance(selection, list) else [selection]
+            active.append((dim, tuple(sorted(map(str, values)))))
+    return tuple(active), tuple(income_range) if income_range is not None else None
+
+
+class ResultCache:
+    """LRU cache bounded by both entry count and estimated memory"""
+    
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    @property
+    def nbytes(self):
+        return self._nbytes
+    
+    def get_or_compute(self, key, compute):
+        """Return the cached value for ``key``, computing and storing it on a miss"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+        
+        # Compute outside the lock so slow misses don't block other sessions
+        value = compute()
+        nbytes = estimate_nbytes(value)
+        with self._lock:
+            if key not in self._entries and nbytes <= self.max_bytes:
+                self._entries[key] = (value, nbytes)
+                self._nbytes += nbytes
+                self._evict()
+        return value
+    
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries or self._nbytes > self.max_bytes):
+            _, (_, nbytes) = self._entries.popitem(last=False)
+            self._nbytes -= nbytes
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
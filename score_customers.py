@@ -0,0 +1,153 @@
+"""Headless batch scoring of customer files with a trained uplift model
+
+Usage:
+    python score_customers.py train --input promo_uplift_enriched.csv --model models/uplift.joblib
+    python score_customers.py score --input customers.csv --model models/uplift.joblib --output scores.parquet
+
+Scoring streams the input in fixed-size batches, scores them in a pool of
+worker processes and writes customer_id, customer_segment and uplift_score
+in input order. Only pandas, pyarrow and scikit-learn are imported; the
+dashboard's UI stack is never loaded.
+"""
+import argparse
+import collections
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import pyarrow.parquet as pq
+
+from export import BatchWriter
+from ingest import SCHEMA, atomic_path, read_csv_typed, read_promo_data
+from segmentation import preprocess
+from tuning import _limit_threads
+from uplift_models import LEARNERS, UpliftModel
+
+OUTPUT_COLUMNS = ['customer_id', 'customer_segment', 'uplift_score']
+
+_worker_model = None
+
+
+def load_scoring_model(path):
+    """Load an UpliftModel saved by ``train`` or a dashboard model registry entry"""
+    model = joblib.load(path)
+    # Registry entries are (model, features) tuples
+    return model[0] if isinstance(model, tuple) else model
+
+
+def iter_batches(path, batch_size):
+    """Yield typed DataFrame batches from a CSV or Parquet file"""
+    if path.endswith('.parquet'):
+        parquet = pq.ParquetFile(path)
+        for batch in parquet.iter_batches(batch_size=batch_size):
+            df = batch.to_pandas()
+            yield df.astype({col: dtype for col, dtype in SCHEMA.items() if col in df.columns})
+    else:
+        with read_csv_typed(path, chunksize=batch_size) as reader:
+            yield from reader
+
+
+def score_batch(model, batch):
+    """Segment and score one batch, returning the output columns"""
+    batch = preprocess(batch)
+    batch['uplift_score'] = model.predict_uplift(batch)
+    return batch[[col for col in OUTPUT_COLUMNS if col in batch.columns]]
+
+
+def _init_worker(model_path, n_threads):
+    global _worker_model
+    _limit_threads(n_threads)
+    _worker_model = load_scoring_model(model_path)
+
+
+def _score_in_worker(batch):
+    return score_batch(_worker_model, batch)
+
+
+def score_file(input_path, model_path, output_path, batch_size=250_000, workers=1, log=sys.stderr):
+    """Score every row of ``input_path`` and return (rows, seconds)
+    
+    The output appears at ``output_path`` only once every row is written.
+    """
+    start = time.perf_counter()
+    rows = 0
+    
+    def report(writer, scored):
+        nonlocal rows
+        writer.write(scored)
+        rows += len(scored)
+        elapsed = time.perf_counter() - start
+        print(f"scored {rows:,} rows ({rows / elapsed:,.0f} rows/sec)", file=log)
+    
+    # The hidden temporary keeps the extension, which selects the format
+    with atomic_path(output_path) as tmp_path:
+        writer = BatchWriter(tmp_path)
+        try:
+            if workers <= 1:
+                model = load_scoring_model(model_path)
+                for batch in iter_batches(input_path, batch_size):
+                    report(writer, score_batch(model, batch))
+            else:
+                context = multiprocessing.get_context('spawn')
+                # Workers share the cores instead of each predicting on all of them
+                n_threads = max(1, (os.cpu_count() or 1) // workers)
+                with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                                         initargs=(model_path, n_threads)) as pool:
+                    # Bound the batches in flight so memory stays flat; write in input order
+                    pending = collections.deque()
+                    for batch in iter_batches(input_path, batch_size):
+                        pending.append(pool.submit(_score_in_worker, batch))
+                        if len(pending) >= 2 * workers:
+                            report(writer, pending.popleft().result())
+                    while pending:
+                        report(writer, pending.popleft().result())
+        finally:
+            writer.close()
+    return rows, time.perf_counter() - start
+
+
+def train(input_path, model_path, learner='t', max_iter=100):
+    """Fit an UpliftModel on a labelled promo file and save it"""
+    if input_path.endswith('.parquet'):
+        df = pq.read_table(input_path).to_pandas()
+        df = preprocess(df.astype({col: dtype for col, dtype in SCHEMA.items() if col in df.columns}))
+    else:
+        df = preprocess(read_promo_data(input_path))
+    model = UpliftModel(learner, max_iter=max_iter, random_state=42).fit(df)
+    os.makedirs(os.path.dirname(model_path) or '.', exist_ok=True)
+    model.save(model_path)
+    return model
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Batch uplift scoring without the dashboard')
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    train_parser = commands.add_parser('train', help='fit and save an uplift model')
+    train_parser.add_argument('--input', required=True)
+    train_parser.add_argument('--model', required=True)
+    train_parser.add_argument('--learner', default='t', choices=LEARNERS)
+    train_parser.add_argument('--max-iter', type=int, default=100)
+    
+    score_parser = commands.add_parser('score', help='score a customer file')
+    score_parser.add_argument('--input', required=True)
+    score_parser.add_argument('--model', required=True)
+    score_parser.add_argument('--output', required=True, help='.csv or .parquet')
+    score_parser.add_argument('--batch-size', type=int, default=250_000)
+    score_parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    
+    args = parser.parse_args()
+    if args.command == 'train':
+        start = time.perf_counter()
+        train(args.input, args.model, args.learner, args.max_iter)
+        print(f"saved {args.learner}-learner to {args.model} in {time.perf_counter() - start:.2f}s")
+    else:
+        rows, seconds = score_file(args.input, args.model, args.output, args.batch_size, args.workers)
+        print(f"wrote {rows:,} scores to {args.output} in {seconds:.2f}s ({rows / seconds:,.0f} rows/sec)")
+
+
+if __name__ == '__main__':
+    main()
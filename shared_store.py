@@ -0,0 +1,133 @@
+"""Process-wide, read-only dataset snapshots shared by every dashboard session"""
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from aggregate_cube import AggregateCube
+from append_store import open_append_store
+from config import PARALLEL_WORKERS, STREAM_CHUNK_SIZE, STREAM_MAX_RSS_MB
+from filter_index import FilterIndex, PartitionedFilterIndex
+from ingest import concat_typed
+from profiling import get_profiler
+from uplift_core import calculate_customer_segments, load_data
+
+
+class DatasetSnapshot:
+    """One version of the dataset and everything derived from it, never modified after construction
+    
+    Numeric columns are zero-copy views of the memory-mapped Feather cache,
+    so their pages live in the OS page cache and are shared by every server
+    process that maps the same file. Sessions only ever receive views.
+    Rows may instead be given as ``parts`` (one frame per appended drop), each
+    with its own filter index; the combined frame is then only assembled when
+    a panel asks for every row.
+    """
+    
+    def __init__(self, signature, df=None, cube=None, filter_index=None, stream_report=None, parts=None):
+        profiler = get_profiler()
+        if cube is None:
+            with profiler.stage('aggregate_cube'):
+                cube = AggregateCube.from_frame(df)
+        if filter_index is None and df is not None:
+            with profiler.stage('filter_index'):
+                filter_index = FilterIndex(df)
+        self.signature = signature
+        self.cube = cube
+        self.filter_index = filter_index
+        self.stream_report = stream_report
+        self.created_at = time.time()
+        self._df = df
+        self._parts = parts
+        self._offsets = None if parts is None else np.cumsum([0] + [len(part) for part in parts])
+        self._lock = threading.Lock()
+    
+    @property
+    def has_rows(self):
+        """True when row-level data is kept (not in streaming or SQL mode)"""
+        return self._df is not None or bool(self._parts)
+    
+    @property
+    def frame(self):
+        """Row-level view for one session (None in streaming mode); writes to it never reach the snapshot"""
+        if self._df is None and self._parts:
+            with self._lock:
+                if self._df is None:
+                    with get_profiler().stage('concat_parts'):
+                        self._df = concat_typed(self._parts)
+        # A shallow copy shares every buffer; copy-on-write (always on from pandas 3.0,
+        # the required minimum) copies only what a session assigns or edits
+        return None if self._df is None else self._df.copy(deep=False)
+    
+    def take(self, positions, columns=None):
+        """Rows at sorted ``positions``, read from the parts without assembling the whole frame"""
+        if self._parts is None or self._df is not None:
+            df = self._df if columns is None else self._df[columns]
+            return df.iloc[positions]
+        parts = self._parts if columns is None else [part[columns] for part in self._parts]
+        owners = np.searchsorted(self._offsets, positions, side='right') - 1
+        pieces = [parts[i].iloc[positions[owners == i] - self._offsets[i]] for i in np.unique(owners)]
+        rows = concat_typed(pieces or [parts[0].iloc[:0]])
+        return rows.set_axis(pd.Index(positions), axis=0)
+    
+    def head(self, positions, n):
+        """The first ``n`` rows at ``positions`` (of all rows when None)"""
+        return self.take(np.arange(min(n, self.n_rows)) if positions is None else positions[:n])
+    
+    @property
+    def n_rows(self):
+        """Rows in the snapshot (from the cube when rows are not kept)"""
+        if self._parts is not None:
+            return int(self._offsets[-1])
+        return len(self._df) if self._df is not None else int(self.cube.totals()['count'])
+    
+    @property
+    def nbytes(self):
+        """Memory held by the rows, counted once however many sessions view them"""
+        if self._parts is not None:
+            return sum(int(part.memory_usage(index=False).sum()) for part in self._parts)
+        return int(self._df.memory_usage(index=False).sum()) if self._df is not None else 0
+
+
+def load_snapshot(path, signature):
+    """Serial path: memory-mapped load, segmentation, then cube and filter index"""
+    profiler = get_profiler()
+    with profiler.stage('load_data'):
+        df = load_data(path)
+    with profiler.stage('calculate_customer_segments'):
+        df = calculate_customer_segments(df)
+    return DatasetSnapshot(signature, df)
+
+
+def partitioned_snapshot(path, signature, n_workers=PARALLEL_WORKERS):
+    """Parallel cold start: partitions are preprocessed and aggregated in a process pool"""
+    from parallel import preprocess_partitioned
+    with get_profiler().stage('preprocess_partitioned'):
+        df, cube = preprocess_partitioned(path, n_workers)
+    return DatasetSnapshot(signature, df, cube)
+
+
+def streamed_snapshot(path, signature, chunk_size=STREAM_CHUNK_SIZE, max_rss_mb=STREAM_MAX_RSS_MB):
+    """Out-of-core: only the merged cube is kept, without rows or a filter index"""
+    from streaming import stream_cube
+    with get_profiler().stage('stream_cube'):
+        cube, report = stream_cube(path, chunk_size, max_rss_mb)
+    return DatasetSnapshot(signature, cube=cube, stream_report=report)
+
+
+def sql_snapshot(path, signature, backend='sql'):
+    """SQL backend: rows live in an embedded database and every query is pushed down to it"""
+    from sql_backend import SqlCube, resolve_engine
+    with get_profiler().stage('sql_open'):
+        cube = SqlCube.open(path, signature, resolve_engine(backend))
+    return DatasetSnapshot(signature, cube=cube)
+
+
+def appended_snapshot(path, signature):
+    """Append mode: only new drops are parsed, segmented and indexed; their cells join the running cube"""
+    store = open_append_store(path)
+    with get_profiler().stage('append_sync'):
+        store.sync()
+    parts, indexes, cube = store.current_parts()
+    return DatasetSnapshot(signature, cube=cube, filter_index=PartitionedFilterIndex(indexes), parts=parts)
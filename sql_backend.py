@@ -0,0 +1,257 @@
+"""Embedded SQL backend: filters and roll-ups pushed down to SQLite or DuckDB
+
+The promo data is loaded chunk by chunk (segmented exactly like the pandas
+path) into a single table in a local database file, so the dataset never has
+to fit in memory. SQLite gets an index per filter dimension; DuckDB, when
+installed, scans its columnar storage in parallel. ``SqlCube`` answers the
+same queries as ``AggregateCube`` and returns identical frames.
+"""
+import importlib.util
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from aggregate_cube import (CATEGORY_DIMENSIONS, CUBE_DIMENSIONS, INCOME_BUCKET_WIDTH, MEASURES, AggregateCube,
+                            income_buckets, income_edges)
+from append_store import store_fingerprint
+from config import CACHE_DIR, DATA_PATH, STREAM_CHUNK_SIZE
+from filter_index import FILTER_DIMENSIONS, is_unfiltered
+from ingest import SCHEMA, atomic_path, read_csv_typed, source_files
+from profiling import get_profiler
+from segmentation import preprocess
+
+TABLE = 'promo'
+DERIVED_COLUMNS = ['income_segment', 'age_segment', 'customer_segment', 'income_bucket']
+COLUMNS = list(SCHEMA) + DERIVED_COLUMNS
+INDEXED_COLUMNS = FILTER_DIMENSIONS + ['income_bucket']
+
+_SQL_TYPES = {'int8': 'INTEGER', 'int16': 'INTEGER', 'int32': 'INTEGER', 'float32': 'DOUBLE', 'category': 'TEXT'}
+_ROLLUP_MEASURES = ("COUNT(*) AS count, SUM(purchase_made) AS purchase_sum, SUM(basket_size) AS basket_sum, "
+                    "SUM(basket_size * basket_size) AS basket_sq_sum")
+
+
+def duckdb_available():
+    return importlib.util.find_spec('duckdb') is not None
+
+
+def resolve_engine(backend):
+    """'sqlite' or 'duckdb' for a configured backend ('sql' picks DuckDB when it is installed)"""
+    if backend == 'sql':
+        return 'duckdb' if duckdb_available() else 'sqlite'
+    if backend not in ('sqlite', 'duckdb'):
+        raise ValueError(f"Unknown SQL backend {backend!r}; expected 'sql', 'sqlite' or 'duckdb'")
+    return backend
+
+
+def database_path(path=DATA_PATH, engine='sqlite', cache_dir=CACHE_DIR):
+    """Location of the database file for a source CSV or drop directory"""
+    stem = os.path.splitext(os.path.basename(os.path.normpath(path)))[0]
+    return os.path.join(cache_dir, f'{stem}.{engine}.db')
+
+
+def _connect(db_path, engine, read_only):
+    if engine == 'duckdb':
+        import duckdb
+        return duckdb.connect(db_path, read_only=read_only)
+    import sqlite3
+    if read_only:
+        return sqlite3.connect(f'file:{db_path}?mode=ro', uri=True, check_same_thread=False)
+    return sqlite3.connect(db_path)
+
+
+def _column_types():
+    types = {col: _SQL_TYPES[dtype] for col, dtype in SCHEMA.items()}
+    types.update({col: 'TEXT' for col in DERIVED_COLUMNS}, income_bucket='INTEGER')
+    return types
+
+
+def _insert_chunk(connection, engine, chunk):
+    if engine == 'duckdb':
+        connection.register('chunk', chunk)
+        connection.execute(f"INSERT INTO {TABLE} SELECT {', '.join(COLUMNS)} FROM chunk")
+        connection.unregister('chunk')
+    else:
+        rows = zip(*(chunk[col].tolist() for col in COLUMNS))
+        connection.executemany(f"INSERT INTO {TABLE} VALUES ({', '.join('?' * len(COLUMNS))})", rows)
+
+
+def build_database(path, signature, db_path, engine='sqlite', chunk_size=STREAM_CHUNK_SIZE):
+    """Load every source CSV into a fresh database file, then index it"""
+    profiler = get_profiler()
+    # Sessions still reading the previous file keep their handle; new opens see the new one
+    with atomic_path(db_path) as tmp_path:
+        connection = _connect(tmp_path, engine, read_only=False)
+        try:
+            columns = ', '.join(f'{col} {sql_type}' for col, sql_type in _column_types().items())
+            connection.execute(f"CREATE TABLE {TABLE} ({columns})")
+            connection.execute("CREATE TABLE promo_meta (key TEXT, value TEXT)")
+            with profiler.stage('sql_load'):
+                for source in source_files(path):
+                    with read_csv_typed(source, usecols=list(SCHEMA), chunksize=chunk_size) as reader:
+                        for chunk in reader:
+                            chunk = preprocess(chunk)
+                            chunk['income_bucket'] = income_buckets(chunk['income'])
+                            # Text columns go in as plain strings on both engines
+                            chunk = chunk.astype({col: str for col in COLUMNS if chunk[col].dtype == 'category'})
+                            _insert_chunk(connection, engine, chunk)
+            if engine == 'sqlite':
+                # DuckDB prunes with per-block min/max instead; secondary indexes would only slow its loads
+                with profiler.stage('sql_index'):
+                    for col in INDEXED_COLUMNS:
+                        connection.execute(f"CREATE INDEX idx_{col} ON {TABLE} ({col})")
+                    connection.execute("ANALYZE")
+            connection.executemany("INSERT INTO promo_meta VALUES (?, ?)",
+                                   [('signature', repr(signature)), ('fingerprint', store_fingerprint())])
+            connection.commit()
+        finally:
+            connection.close()
+    return db_path
+
+
+def database_is_fresh(db_path, signature, engine='sqlite'):
+    """True when the database was built from this version of the source with the current rules"""
+    if not os.path.exists(db_path):
+        return False
+    try:
+        connection = _connect(db_path, engine, read_only=True)
+        try:
+            meta = dict(connection.execute("SELECT key, value FROM promo_meta").fetchall())
+        finally:
+            connection.close()
+    except Exception:
+        return False
+    return meta.get('signature') == repr(signature) and meta.get('fingerprint') == store_fingerprint()
+
+
+class SqlCube(AggregateCube):
+    """``AggregateCube`` queries answered by the embedded database instead of in-memory cells
+    
+    Roll-ups return the same columns, dtypes and row order as the pandas
+    cube: basket sizes are integers, so SQL sums are exact. Each thread gets
+    its own read-only connection (or DuckDB cursor).
+    """
+    
+    def __init__(self, db_path, engine='sqlite'):
+        super().__init__(cells=None)
+        self.db_path = db_path
+        self.engine = engine
+        self._local = threading.local()
+        self._shared = _connect(db_path, engine, read_only=True) if engine == 'duckdb' else None
+        # Roll-up keys come back as categoricals over every stored value, like the cube's cells
+        self._categories = {dim: self._distinct(dim) for dim in CATEGORY_DIMENSIONS}
+    
+    @classmethod
+    def open(cls, path=DATA_PATH, signature=None, engine='sqlite'):
+        """Open the database for a source, (re)building it first when the source has changed"""
+        db_path = database_path(path, engine)
+        if not database_is_fresh(db_path, signature, engine):
+            build_database(path, signature, db_path, engine)
+        return cls(db_path, engine)
+    
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            if self._shared is not None:
+                connection = self._shared.cursor()
+            else:
+                connection = _connect(self.db_path, self.engine, read_only=True)
+            self._local.connection = connection
+        return connection
+    
+    def _query(self, sql, params=()):
+        cursor = self._connection().execute(sql, list(params))
+        columns = [description[0] for description in cursor.description]
+        return pd.DataFrame.from_records(cursor.fetchall(), columns=columns)
+    
+    def _distinct(self, dim):
+        return self._query(f"SELECT DISTINCT {dim} FROM {TABLE} ORDER BY {dim}")[dim].tolist()
+    
+    @staticmethod
+    def _where(where=None, income_range=None, range_column='income_bucket'):
+        """WHERE clause and parameters for a filter state (income on buckets, like the cube, or raw values)
+        
+        Either way the income range is snapped to bucket edges and half-open, so both select the same rows.
+        """
+        clauses, params = [], []
+        for dim, selection in (where or {}).items():
+            if dim not in CUBE_DIMENSIONS:
+                raise ValueError(f"Unknown filter dimension {dim!r}")
+            if not is_unfiltered(selection):
+                values = selection if isinstance(selection, list) else [selection]
+                clauses.append(f"{dim} IN ({', '.join('?' * len(values))})")
+                params.extend(str(value) for value in values)
+        if income_range is not None:
+            low, high = income_edges(income_range)
+            clauses.append(f"{range_column} >= ? AND {range_column} < ?")
+            if range_column == 'income_bucket':
+                params.extend([int(low // INCOME_BUCKET_WIDTH), int(high // INCOME_BUCKET_WIDTH)])
+            else:
+                params.extend([low, high])
+        return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+    
+    def values(self, dim):
+        """Distinct values of a dimension"""
+        return list(self._categories[dim]) if dim in self._categories else self._distinct(dim)
+    
+    def income_bounds(self):
+        """Lowest and highest income in the table"""
+        bounds = self._query(f"SELECT MIN(income) AS low, MAX(income) AS high FROM {TABLE}")
+        return float(bounds['low'].iloc[0]), float(bounds['high'].iloc[0])
+    
+    def rollup(self, by, where=None, income_range=None):
+        """Sum the measures over the rows matching the filters, grouped by ``by``"""
+        clause, params = self._where(where, income_range)
+        keys = ', '.join(by)
+        stats = self._query(f"SELECT {keys}, {_ROLLUP_MEASURES} FROM {TABLE}{clause} GROUP BY {keys}", params)
+        dtypes = {'count': np.int64, 'purchase_sum': np.int64, 'basket_sum': np.float64,
+                  'basket_sq_sum': np.float64, 'income_bucket': np.int32, 'promo_exposed': np.int8}
+        dtypes.update({dim: pd.CategoricalDtype(self._categories[dim]) for dim in by if dim in self._categories})
+        stats = stats.astype({col: dtype for col, dtype in dtypes.items() if col in stats.columns})
+        # Sort in pandas so the order follows category codes exactly as the cube's groupby does
+        return stats.sort_values(by, ignore_index=True)[by + MEASURES]
+    
+    def totals(self, where=None, income_range=None):
+        """Sum of the measures over the rows matching the filters"""
+        clause, params = self._where(where, income_range)
+        stats = self._query(f"SELECT {_ROLLUP_MEASURES}, "
+                            f"SUM(CASE WHEN promo_exposed = 1 THEN 1 ELSE 0 END) AS exposed_count "
+                            f"FROM {TABLE}{clause}", params)
+        return stats.iloc[0].fillna(0).astype(np.float64).rename(None)
+    
+    def _rows_query(self, selections, value_range, columns):
+        clause, params = self._where(selections, value_range, range_column='income')
+        select = ', '.join(columns) if columns else '*'
+        return f"SELECT {select} FROM {TABLE}{clause} ORDER BY rowid", params
+    
+    @staticmethod
+    def _typed_rows(rows):
+        # income_bucket is a storage detail; the rows match the pandas frame's columns
+        rows = rows.drop(columns='income_bucket', errors='ignore')
+        return rows.astype({col: dtype for col, dtype in SCHEMA.items() if col in rows.columns})
+    
+    def select_rows(self, selections, value_range=None, limit=None):
+        """Rows matching the filters in load order, income compared on raw values within the bucket edges"""
+        sql, params = self._rows_query(selections, value_range, None)
+        limit_clause = f" LIMIT {int(limit)}" if limit else ''
+        return self._typed_rows(self._query(f"{sql}{limit_clause}", params))
+    
+    def iter_rows(self, selections, value_range=None, columns=None, chunk_rows=STREAM_CHUNK_SIZE):
+        """Matching rows in load order as typed chunks, fetched ``chunk_rows`` at a time from one cursor"""
+        unknown = [col for col in columns or [] if col not in COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown column(s): {', '.join(unknown)}")
+        sql, params = self._rows_query(selections, value_range, columns)
+        # A private cursor: the thread's shared one may run other queries while this is consumed
+        connection = self._shared.cursor() if self._shared is not None else _connect(self.db_path, self.engine, True)
+        try:
+            cursor = connection.execute(sql, list(params))
+            names = [description[0] for description in cursor.description]
+            while True:
+                records = cursor.fetchmany(chunk_rows)
+                yield self._typed_rows(pd.DataFrame.from_records(records, columns=names))
+                if len(records) < chunk_rows:
+                    break
+        finally:
+            connection.close()
@@ -0,0 +1,88 @@
+"""Out-of-core pipeline: stream the source in chunks and merge per-chunk aggregates"""
+import argparse
+import time
+
+from aggregate_cube import AggregateCube, add_rates
+from config import DATA_PATH, STREAM_CHUNK_SIZE, STREAM_MAX_RSS_MB
+from ingest import read_csv_typed, source_files
+from profiling import current_rss_mb
+from segmentation import preprocess
+
+# Never shrink chunks below this many rows when backing off from the RSS budget
+MIN_CHUNK_SIZE = 10_000
+
+
+class StreamReport:
+    """Chunking and memory statistics for one streaming run"""
+    
+    def __init__(self, chunk_size, max_rss_mb):
+        self.initial_chunk_size = chunk_size
+        self.max_rss_mb = max_rss_mb
+        self.chunk_sizes = []
+        self.rows = 0
+        self.peak_rss_mb = current_rss_mb()
+        self.seconds = 0.0
+    
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'chunks': len(self.chunk_sizes),
+            'initial_chunk_size': self.initial_chunk_size,
+            'final_chunk_size': self.chunk_sizes[-1] if self.chunk_sizes else self.initial_chunk_size,
+            'max_rss_mb': self.max_rss_mb,
+            'peak_rss_mb': round(self.peak_rss_mb, 1),
+            'seconds': round(self.seconds, 3),
+            'rows_per_sec': round(self.rows / self.seconds) if self.seconds else None,
+        }
+
+
+def stream_cube(path=DATA_PATH, chunk_size=STREAM_CHUNK_SIZE, max_rss_mb=STREAM_MAX_RSS_MB):
+    """Build the aggregate cube chunk by chunk, returning it with a StreamReport
+
+    Each chunk is binned and segmented exactly like the in-memory path and
+    folded into the running cube before the next chunk is read. When
+    ``max_rss_mb`` is set and the process grows past it, the chunk size is
+    halved (down to MIN_CHUNK_SIZE) for the remaining chunks.
+    """
+    report = StreamReport(chunk_size, max_rss_mb)
+    start = time.perf_counter()
+    cube = None
+    # A drop directory is streamed file by file, in name order
+    for source in source_files(path):
+        with read_csv_typed(source, chunksize=chunk_size) as reader:
+            while True:
+                try:
+                    chunk = reader.get_chunk(chunk_size)
+                except StopIteration:
+                    break
+                chunk_cube = AggregateCube.from_frame(preprocess(chunk))
+                cube = chunk_cube if cube is None else AggregateCube.combine([cube, chunk_cube])
+                report.rows += len(chunk)
+                report.chunk_sizes.append(len(chunk))
+                del chunk, chunk_cube
+                
+                rss = current_rss_mb()
+                report.peak_rss_mb = max(report.peak_rss_mb, rss)
+                if max_rss_mb and rss > max_rss_mb and chunk_size > MIN_CHUNK_SIZE:
+                    chunk_size = max(MIN_CHUNK_SIZE, chunk_size // 2)
+    report.seconds = time.perf_counter() - start
+    return cube, report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stream a promo export into uplift aggregates')
+    parser.add_argument('path', nargs='?', default=DATA_PATH)
+    parser.add_argument('--chunk-size', type=int, default=STREAM_CHUNK_SIZE)
+    parser.add_argument('--max-rss-mb', type=float, default=STREAM_MAX_RSS_MB)
+    args = parser.parse_args()
+    
+    cube, report = stream_cube(args.path, args.chunk_size, args.max_rss_mb)
+    for key, value in report.as_dict().items():
+        print(f"{key:>20}: {value}")
+    segment_stats = add_rates(cube.rollup(['customer_segment', 'promo_exposed']))
+    print(segment_stats[['customer_segment', 'promo_exposed', 'count', 'response_rate', 'avg_basket_size']]
+          .to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
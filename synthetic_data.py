@@ -0,0 +1,119 @@
+"""Synthetic promo datasets with the promo_uplift_enriched schema, from 10K to 100M+ rows
+
+Usage: python synthetic_data.py --rows 10000000 [--out .cache/synthetic/promo_10000000.csv] [--seed 42]
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+from config import CACHE_DIR
+from ingest import atomic_path
+
+# Category shares observed in promo_uplift_enriched.csv
+CATEGORY_SHARES = {
+    'promo_type': {'BOGO': 0.25, 'Coupon': 0.265, 'Discount': 0.24, 'Loyalty Points': 0.245},
+    'channel': {'App Notification': 0.335, 'Email': 0.345, 'SMS': 0.32},
+    'customer_status': {'Existing': 0.58, 'Lapsed': 0.215, 'New': 0.205},
+    'product_category': {'Apparel': 0.25, 'Books': 0.25, 'Electronics': 0.265, 'Groceries': 0.235},
+}
+EXPOSURE_RATE = 0.5
+# Purchase probability without a promotion, and the promotion's lift by customer status
+BASE_RESPONSE = 0.10
+TREATMENT_EFFECT = {'Existing': 0.05, 'Lapsed': 0.14, 'New': 0.12}
+# Multiplier on the lift by promo type (coupons convert best in the sample)
+PROMO_EFFECT_SCALE = {'BOGO': 0.8, 'Coupon': 1.3, 'Discount': 0.9, 'Loyalty Points': 1.0}
+
+# Rows generated per chunk when writing; bounds memory independently of the total size
+WRITE_CHUNK_ROWS = 1_000_000
+
+
+def _categorical(rng, column, n_rows):
+    """Draw a categorical column with the observed shares"""
+    shares = CATEGORY_SHARES[column]
+    categories = list(shares)
+    p = np.array(list(shares.values()))
+    codes = rng.choice(len(categories), size=n_rows, p=p / p.sum()).astype(np.int8)
+    return pd.Categorical.from_codes(codes, categories=categories)
+
+
+def generate_chunk(n_rows, start_id=1, seed=42):
+    """One chunk of synthetic rows with customer ids starting at ``start_id``"""
+    rng = np.random.default_rng([seed, start_id])
+    status = _categorical(rng, 'customer_status', n_rows)
+    promo_type = _categorical(rng, 'promo_type', n_rows)
+    exposed = (rng.random(n_rows) < EXPOSURE_RATE).astype(np.int8)
+    
+    # Lift depends on who is targeted and with what; looked up through category codes
+    status_effect = np.array([TREATMENT_EFFECT[c] for c in status.categories])[status.codes]
+    promo_scale = np.array([PROMO_EFFECT_SCALE[c] for c in promo_type.categories])[promo_type.codes]
+    p = BASE_RESPONSE + exposed * status_effect * promo_scale
+    
+    return pd.DataFrame({
+        'customer_id': np.arange(start_id, start_id + n_rows, dtype=np.int64),
+        'age': rng.integers(18, 70, size=n_rows, dtype=np.int8),
+        'income': np.clip(rng.normal(45_000, 14_500, size=n_rows), 2_500, None).round(-2).astype(np.int32),
+        'total_spent_last_month': np.maximum(rng.exponential(189.0, size=n_rows), 0.01).round(2),
+        'promo_exposed': exposed,
+        'purchase_made': (rng.random(n_rows) < p).astype(np.int8),
+        'basket_size': np.minimum(1 + rng.poisson(2.97, size=n_rows), 15).astype(np.int16),
+        'promo_type': promo_type,
+        'channel': _categorical(rng, 'channel', n_rows),
+        'customer_status': status,
+        'product_category': _categorical(rng, 'product_category', n_rows),
+    })
+
+
+def generate_frame(n_rows, seed=42):
+    """A synthetic dataset held in memory (use ``write_synthetic_csv`` for large sizes)"""
+    return generate_chunk(n_rows, 1, seed)
+
+
+def synthetic_path(n_rows, seed=42, data_dir=os.path.join(CACHE_DIR, 'synthetic')):
+    """Default location of a generated dataset"""
+    return os.path.join(data_dir, f'promo_{n_rows}_{seed}.csv')
+
+
+def write_synthetic_csv(path, n_rows, seed=42, chunk_rows=WRITE_CHUNK_ROWS):
+    """Stream ``n_rows`` synthetic rows to a CSV without holding them all in memory"""
+    with atomic_path(path) as tmp_path:
+        writer = None
+        try:
+            for start in range(0, n_rows, chunk_rows):
+                chunk = generate_chunk(min(chunk_rows, n_rows - start), start + 1, seed)
+                # Categories are written as plain strings, like the source export
+                table = pa.Table.from_pandas(chunk.astype({col: str for col in CATEGORY_SHARES}),
+                                             preserve_index=False)
+                if writer is None:
+                    writer = pa_csv.CSVWriter(tmp_path, table.schema)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+    return path
+
+
+def ensure_synthetic_csv(n_rows, seed=42, data_dir=os.path.join(CACHE_DIR, 'synthetic')):
+    """Path to a generated dataset, writing it only if it does not exist yet"""
+    path = synthetic_path(n_rows, seed, data_dir)
+    if not os.path.exists(path):
+        write_synthetic_csv(path, n_rows, seed)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, required=True)
+    parser.add_argument('--out', default=None)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    
+    path = write_synthetic_csv(args.out or synthetic_path(args.rows, args.seed), args.rows, args.seed)
+    print(f"Wrote {args.rows:,} rows to {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1 +1,250 @@
- 
\ No newline at end of file
+"""Consistency tests for the dashboard's data paths on a small synthetic dataset"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from aggregate_cube import AggregateCube, income_edges
+from allocation import AUDIENCE, allocate, allocation_moves, cell_uplift, contact_costs, max_useful_budget
+from append_store import AppendStore
+from bootstrap import BOOTSTRAP_METHODS, bootstrap_uplift
+from export import row_mask
+from filter_index import FilterIndex, PartitionedFilterIndex
+from ingest import read_csv_typed, read_promo_data
+from parallel import preprocess_partitioned
+from segmentation import preprocess
+from sql_backend import SqlCube, build_database
+from streaming import stream_cube
+from synthetic_data import generate_frame
+from uplift_evaluation import evaluate_uplift
+
+N_ROWS = 2000
+FILTER_STATES = [
+    ({}, None),
+    ({'channel': ['Email', 'SMS'], 'promo_type': 'BOGO'}, None),
+    ({'customer_segment': 'Lapsed Customers', 'product_category': ['Books', 'All']}, (30000, 80000)),
+    ({'channel': 'App Notification', 'product_category': ['Books', 'Groceries']}, (0, 45000)),
+]
+
+
+@pytest.fixture(scope='module')
+def source_path(tmp_path_factory):
+    path = tmp_path_factory.mktemp('data') / 'promo.csv'
+    generate_frame(N_ROWS, seed=7).to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.fixture(scope='module')
+def cache_dir(tmp_path_factory):
+    return str(tmp_path_factory.mktemp('cache'))
+
+
+@pytest.fixture(scope='module')
+def frame(source_path, cache_dir):
+    return preprocess(read_promo_data(source_path, cache_dir=cache_dir))
+
+
+@pytest.fixture(scope='module')
+def sql_cube(source_path, tmp_path_factory):
+    db_path = str(tmp_path_factory.mktemp('db') / 'promo.sqlite')
+    return SqlCube(build_database(source_path, ('test',), db_path))
+
+
+@pytest.mark.parametrize('income_range', [(20050, 40049), (20000, 40000), (0, 10**6), (35000.5, 35000.7)])
+def test_income_range_matches_across_backends(frame, sql_cube, income_range):
+    cube = AggregateCube.from_frame(frame)
+    low, high = income_edges(income_range)
+    expected = int(((frame['income'] >= low) & (frame['income'] < high)).sum())
+    
+    assert cube.totals(None, income_range)['count'] == expected
+    assert sql_cube.totals(None, income_range)['count'] == expected
+    assert len(sql_cube.select_rows({}, income_range)) == expected
+    assert row_mask(frame, {}, income_range).sum() == expected
+    positions = FilterIndex(frame).select({}, (low, high))
+    assert (N_ROWS if positions is None else len(positions)) == expected
+
+
+def test_income_edges_snap_outward_to_buckets():
+    assert income_edges((20050, 40049)) == (20000.0, 40100.0)
+    assert income_edges((20000, 40000)) == (20000.0, 40000.0)
+    # A range inside one bucket still covers that whole bucket
+    assert income_edges((35000.5, 35000.7)) == (35000.0, 35100.0)
+
+
+def test_cold_and_warm_loads_match_the_csv(source_path, tmp_path):
+    expected = read_csv_typed(source_path)
+    cold = read_promo_data(source_path, cache_dir=str(tmp_path))
+    warm = read_promo_data(source_path, cache_dir=str(tmp_path))
+    pd.testing.assert_frame_equal(cold, expected)
+    pd.testing.assert_frame_equal(warm, expected)
+
+
+@pytest.mark.parametrize('n_workers, partition_by', [(1, 'rows'), (2, 'rows'), (2, 'channel')])
+def test_partitioned_preprocessing_matches_serial(source_path, cache_dir, frame, n_workers, partition_by):
+    df, cube = preprocess_partitioned(source_path, n_workers, partition_by, n_partitions=3, cache_dir=cache_dir)
+    pd.testing.assert_frame_equal(df, frame)
+    by = ['customer_segment', 'channel', 'income_bucket', 'promo_exposed']
+    pd.testing.assert_frame_equal(cube.rollup(by), AggregateCube.from_frame(frame).rollup(by))
+
+
+def test_streamed_cube_matches_the_in_memory_cube(source_path, frame, tmp_path):
+    # Chunks much smaller than the file, over one file and over a drop directory split at odd sizes
+    drop_dir = tmp_path / 'drops'
+    drop_dir.mkdir()
+    raw = read_csv_typed(source_path)
+    for day, (start, stop) in enumerate([(0, 700), (700, 1450), (1450, N_ROWS)]):
+        raw.iloc[start:stop].to_csv(drop_dir / f'day{day}.csv', index=False)
+    by = ['customer_segment', 'channel', 'income_bucket', 'promo_exposed']
+    expected = AggregateCube.from_frame(frame)
+    for path in (source_path, str(drop_dir)):
+        cube, report = stream_cube(path, chunk_size=300, max_rss_mb=0)
+        assert report.rows == N_ROWS and len(report.chunk_sizes) > 3
+        pd.testing.assert_frame_equal(cube.rollup(by), expected.rollup(by))
+        for selections, income_range in FILTER_STATES:
+            pd.testing.assert_series_equal(cube.totals(selections, income_range),
+                                           expected.totals(selections, income_range))
+
+
+def test_appended_drops_match_a_full_rebuild(tmp_path):
+    drop_dir, store_dir = tmp_path / 'drops', str(tmp_path / 'store')
+    drop_dir.mkdir()
+    first = generate_frame(600, seed=1)
+    # Drops with different category sets: no SMS on the first day, only Email on the last
+    first[first['channel'] != 'SMS'].to_csv(drop_dir / 'day0.csv', index=False)
+    generate_frame(500, seed=2).to_csv(drop_dir / 'day1.csv', index=False)
+    store = AppendStore(str(drop_dir), store_dir).open()
+    assert len(store.sync()) == 2
+    last = generate_frame(400, seed=3)
+    last[last['channel'] == 'Email'].to_csv(drop_dir / 'day2.csv', index=False)
+    assert [entry['name'] for entry in store.sync()] == ['day2.csv']
+    
+    expected = preprocess(read_promo_data(str(drop_dir)))
+    expected_cube = AggregateCube.from_frame(expected)
+    by = ['customer_segment', 'channel', 'income_bucket', 'promo_exposed']
+    reopened = AppendStore(str(drop_dir), store_dir).open()
+    assert reopened.sync() == []
+    for appended in (store, reopened):
+        pd.testing.assert_frame_equal(appended.frame, expected)
+        pd.testing.assert_frame_equal(appended.cube.rollup(by), expected_cube.rollup(by))
+    # Per-part indexes select the same rows as one index over the rebuilt frame
+    parts_index = PartitionedFilterIndex(reopened.current_parts()[1])
+    for selections, income_range in FILTER_STATES:
+        value_range = None if income_range is None else income_edges(income_range)
+        positions = parts_index.select(selections, value_range)
+        expected_positions = FilterIndex(expected).select(selections, value_range)
+        np.testing.assert_array_equal(np.arange(len(expected)) if positions is None else positions,
+                                      np.arange(len(expected)) if expected_positions is None else expected_positions)
+
+
+@pytest.mark.parametrize('selections, income_range', FILTER_STATES)
+def test_filter_index_matches_row_mask(frame, selections, income_range):
+    value_range = None if income_range is None else income_edges(income_range)
+    positions = FilterIndex(frame).select(selections, value_range)
+    expected = np.flatnonzero(row_mask(frame, selections, income_range))
+    np.testing.assert_array_equal(np.arange(N_ROWS) if positions is None else positions, expected)
+
+
+@pytest.mark.parametrize('selections, income_range', FILTER_STATES)
+def test_sql_backend_matches_pandas(frame, sql_cube, selections, income_range):
+    cube = AggregateCube.from_frame(frame)
+    by = ['customer_segment', 'promo_exposed']
+    pd.testing.assert_frame_equal(sql_cube.rollup(by, selections, income_range),
+                                  cube.rollup(by, selections, income_range))
+    pd.testing.assert_series_equal(sql_cube.totals(selections, income_range),
+                                   cube.totals(selections, income_range).astype(np.float64))
+    rows = sql_cube.select_rows(selections, income_range)
+    expected = frame.loc[row_mask(frame, selections, income_range), rows.columns].reset_index(drop=True)
+    # The database keeps the derived segment columns as plain text
+    pd.testing.assert_frame_equal(rows, expected.astype(rows.dtypes.to_dict()), check_categorical=False)
+
+
+@pytest.mark.parametrize('budget_share', [0.0, 0.02, 0.1, 0.4, 1.0, 2.0])
+def test_allocation_matches_the_linear_program(frame, budget_share):
+    linprog = pytest.importorskip('scipy.optimize').linprog
+    cells = cell_uplift(AggregateCube.from_frame(frame))
+    moves = allocation_moves(cells)
+    budget = budget_share * max_useful_budget(moves)
+    plan = allocate(cells, moves, budget)
+    assert plan['spend'].sum() <= budget + 1e-9
+    per_audience = plan.groupby(AUDIENCE)[['customers', 'audience']].agg({'customers': 'sum', 'audience': 'first'})
+    assert (per_audience['customers'] <= per_audience['audience']).all()
+    
+    # The same relaxation: contacts per cell, one budget row and one row per audience
+    groups = cells.groupby(AUDIENCE).ngroup().to_numpy()
+    n_groups = groups.max() + 1
+    constraints = np.vstack([contact_costs(cells), groups == np.arange(n_groups)[:, None]])
+    limits = np.concatenate([[budget], cells.groupby(AUDIENCE)['audience'].first().to_numpy()])
+    optimum = -linprog(-cells['uplift'].to_numpy(), A_ub=constraints, b_ub=limits, bounds=(0, None)).fun
+    # Flooring drops under one customer from each of at most two cells per audience
+    rounding = 2 * n_groups * cells['uplift'].max()
+    assert optimum - rounding <= plan['incremental_purchases'].sum() <= optimum + 1e-6
+
+
+@pytest.mark.parametrize('method', BOOTSTRAP_METHODS)
+def test_bootstrap_intervals_flag_clear_effects_only(method):
+    segment_stats = pd.DataFrame({
+        'customer_segment': ['Clear', 'Clear', 'Null', 'Null', 'No control'],
+        'promo_exposed': [1, 0, 1, 0, 1],
+        'count': [1000, 1000, 800, 800, 500],
+        'purchase_sum': [500, 100, 160, 160, 50],
+    })
+    intervals = bootstrap_uplift(segment_stats, n_replicates=1000, method=method).set_index('customer_segment')
+    
+    clear = intervals.loc['Clear']
+    assert clear['significant'] and clear['p_value'] < 0.01
+    assert clear['uplift_ci_low'] < 0.4 < clear['uplift_ci_high']
+    assert clear['uplift_pct_ci_low'] < 400 < clear['uplift_pct_ci_high']
+    null = intervals.loc['Null']
+    assert not null['significant'] and null['p_value'] > 0.5
+    assert null['uplift_ci_low'] < 0 < null['uplift_ci_high']
+    # Without a control group there is nothing to compare against
+    no_control = intervals.loc['No control']
+    assert no_control[['uplift_ci_low', 'uplift_ci_high', 'p_value']].isna().all()
+    assert not no_control['significant']
+
+
+def _reference_summary(scores, treatment, outcome):
+    """Qini and uplift curves recomputed target set by target set, cut only between distinct scores"""
+    order = np.argsort(-scores, kind='stable')
+    scores, treatment, outcome = scores[order], treatment[order].astype(bool), outcome[order].astype(bool)
+    fraction, qini, uplift = [0.0], [0.0], [0.0]
+    for k in range(1, len(scores) + 1):
+        if k < len(scores) and scores[k] == scores[k - 1]:
+            continue
+        treated, control = outcome[:k][treatment[:k]], outcome[:k][~treatment[:k]]
+        qini.append(treated.sum() - (control.sum() * len(treated) / len(control) if len(control) else 0.0))
+        both = len(treated) and len(control)
+        uplift.append((treated.mean() - control.mean()) * k if both else 0.0)
+        fraction.append(k / len(scores))
+    fraction, qini, uplift = np.array(fraction), np.array(qini), np.array(uplift)
+    n_rows = len(scores)
+    return {
+        'incremental_purchases': qini[-1],
+        'qini_coefficient': np.trapezoid((qini - qini[-1] * fraction) / n_rows, fraction),
+        'auuc': np.trapezoid(uplift / n_rows, fraction),
+    }
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_qini_and_auuc_match_a_direct_computation(seed):
+    rng = np.random.default_rng(seed)
+    # Rounded scores give plenty of ties
+    scores = np.round(rng.normal(size=500), 1)
+    treatment = rng.integers(0, 2, 500)
+    outcome = (rng.random(500) < 0.2 + 0.1 * treatment * (scores > 0)).astype(np.int8)
+    summary = evaluate_uplift(scores, treatment, outcome).summary
+    for metric, value in _reference_summary(scores, treatment, outcome).items():
+        assert summary[metric] == pytest.approx(value, rel=1e-9, abs=1e-12)
+    # Reordering rows with equal scores changes nothing
+    shuffled = rng.permutation(500)
+    assert evaluate_uplift(scores[shuffled], treatment[shuffled], outcome[shuffled]).summary == pytest.approx(summary)
+
+
+def test_uplift_deciles_cover_every_row():
+    scores = np.arange(100, dtype=np.float64)
+    treatment = np.tile([0, 1], 50)
+    outcome = (scores >= 50) & (treatment == 1)
+    evaluation = evaluate_uplift(scores, treatment, outcome)
+    assert evaluation.deciles['customers'].sum() == 100
+    # Only treated customers in the top half buy: 25 of the 50 treated, none in control
+    assert evaluation.summary['incremental_purchases'] == 25
+    assert evaluation.deciles['uplift'].tolist() == [1.0] * 5 + [0.0] * 5
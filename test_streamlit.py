@@ -1 +1,30 @@
- 
\ No newline at end of file
+"""Smoke tests of the dashboard page through Streamlit's AppTest runner"""
+import os
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'promo_uplift_dashboard.py')
+
+
+@pytest.fixture
+def app():
+    return AppTest.from_file(APP_PATH, default_timeout=600).run()
+
+
+def test_default_page_renders(app):
+    assert not app.exception
+    assert not app.error
+    metrics = {metric.label: metric.value for metric in app.metric}
+    assert metrics['Total Transactions'] == '1,000'
+    assert metrics['Filtered Records'] == '1,000'
+    assert len(app.get('plotly_chart')) > 0
+
+
+def test_filters_without_a_comparable_segment_still_render(app):
+    for label, value in [('Select segments', 'Lapsed Customers'), ('Select channels', 'SMS'),
+                         ('Select promo types', 'BOGO'), ('Select categories', 'Books')]:
+        app = next(box for box in app.sidebar.selectbox if box.label == label).select(value).run()
+    assert not app.exception
+    assert any('control and treatment' in info.value for info in app.info)
+    assert len(app.get('plotly_chart')) > 0
@@ -0,0 +1,205 @@
+"""Cross-validated hyperparameter search for the uplift model in a process pool
+
+Work is shared wherever it can be:
+  * the feature matrix is encoded once per dataset and saved as ``.npy``
+    files that every worker memory-maps, keyed by the data fingerprint so a
+    re-run on unchanged data skips encoding entirely;
+  * each (candidate, fold) task grows its ensembles with ``warm_start``
+    through increasing ``max_iter`` checkpoints, so scoring 25, 50, 100 and
+    200 iterations costs one 200-iteration fit;
+  * a task stops early once the held-out Qini coefficient has not improved
+    for ``patience`` checkpoints.
+The best configuration is written to TUNED_PARAMS_PATH, which the dashboard
+and ``load_or_fit_uplift_model`` read in place of the default parameters.
+
+Usage: python tuning.py [PATH] [--folds 3] [--workers 4] [--learners s t] [--max-rows 500000]
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from config import CACHE_DIR, DATA_PATH, TUNED_PARAMS_PATH
+from uplift_evaluation import evaluate_uplift, split_folds
+from uplift_models import CATEGORICAL_FEATURES, NUMERIC_FEATURES, OUTCOME, TREATMENT
+
+# Estimator settings searched over; every combination is one candidate
+SEARCH_SPACE = {
+    'learner': ['s', 't'],
+    'learning_rate': [0.05, 0.1],
+    'max_leaf_nodes': [15, 31],
+    'min_samples_leaf': [20, 100],
+}
+# Boosting iterations scored per candidate, grown with warm_start
+ITERATION_CHECKPOINTS = [25, 50, 100, 200]
+# Checkpoints without a Qini improvement before a task stops
+PATIENCE = 1
+TUNING_METRIC = 'qini_coefficient'
+
+
+def candidate_grid(space=SEARCH_SPACE):
+    """Every combination of the search space as a parameter dict"""
+    keys = list(space)
+    return [dict(zip(keys, values)) for values in itertools.product(*(space[key] for key in keys))]
+
+
+def encoded_matrix_dir(df, cache_dir=CACHE_DIR):
+    """Encode features, treatment and outcome once; returns a directory of memory-mappable arrays"""
+    from feature_pipeline import FeaturePipeline
+    from model_registry import fingerprint_frame
+    
+    columns = NUMERIC_FEATURES + CATEGORICAL_FEATURES + [TREATMENT, OUTCOME]
+    matrix_dir = os.path.join(cache_dir, 'tuning', fingerprint_frame(df, columns)[:16])
+    if os.path.exists(os.path.join(matrix_dir, 'y.npy')):
+        return matrix_dir
+    os.makedirs(os.path.dirname(matrix_dir), exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(matrix_dir))
+    np.save(os.path.join(tmp_dir, 'X.npy'), FeaturePipeline().fit_transform(df))
+    np.save(os.path.join(tmp_dir, 't.npy'), df[TREATMENT].to_numpy().astype(bool))
+    # y.npy is written last: its presence marks a complete directory
+    np.save(os.path.join(tmp_dir, 'y.npy'), df[OUTCOME].to_numpy().astype(np.int8))
+    try:
+        os.rename(tmp_dir, matrix_dir)
+    except OSError:
+        # Another run encoded the same data first
+        pass
+    return matrix_dir
+
+
+def evaluate_candidate(matrix_dir, params, fold, n_folds, seed=42, checkpoints=ITERATION_CHECKPOINTS,
+                       patience=PATIENCE):
+    """Warm-started fit of one candidate on one fold; returns [(max_iter, metric), ...] per checkpoint"""
+    from uplift_models import UpliftModel
+    
+    X = np.load(os.path.join(matrix_dir, 'X.npy'), mmap_mode='r')
+    t = np.load(os.path.join(matrix_dir, 't.npy'), mmap_mode='r')
+    y = np.load(os.path.join(matrix_dir, 'y.npy'), mmap_mode='r')
+    folds = split_folds(len(y), n_folds, seed)
+    valid = np.sort(folds[fold])
+    train = np.sort(np.concatenate([part for i, part in enumerate(folds) if i != fold]))
+    X_train, t_train, y_train = X[train], t[train], y[train]
+    X_valid, t_valid, y_valid = X[valid], t[valid], y[valid]
+    
+    # The library's loss-based early stopping is replaced by the checkpoint loop below
+    model = UpliftModel(**params, warm_start=True, early_stopping=False, random_state=seed)
+    history, best, stale = [], -np.inf, 0
+    for max_iter in checkpoints:
+        model.params['max_iter'] = max_iter
+        model.fit_encoded(X_train, t_train, y_train)
+        score = evaluate_uplift(model.predict_encoded(X_valid), t_valid, y_valid).summary[TUNING_METRIC]
+        history.append((max_iter, score))
+        if score > best:
+            best, stale = score, 0
+        else:
+            stale += 1
+            if stale >= patience:
+                break
+    return history
+
+
+def _run_task(args):
+    return evaluate_candidate(*args)
+
+
+def _limit_threads(n_threads):
+    """Pool initializer: share the cores between workers instead of each boosting on all of them"""
+    from threadpoolctl import threadpool_limits
+    global _thread_limits
+    _thread_limits = threadpool_limits(n_threads)
+
+
+def tune(df, space=SEARCH_SPACE, n_folds=3, n_workers=1, seed=42, checkpoints=ITERATION_CHECKPOINTS,
+         patience=PATIENCE):
+    """Cross-validate every candidate and return (best params, results frame)
+    
+    ``results`` has one row per candidate and checkpoint that every fold
+    reached, with the mean and spread of the metric across folds.
+    """
+    matrix_dir = encoded_matrix_dir(df)
+    candidates = candidate_grid(space)
+    tasks = [(matrix_dir, params, fold, n_folds, seed, checkpoints, patience)
+             for params in candidates for fold in range(n_folds)]
+    if n_workers > 1:
+        # Spawned workers import only numpy, scikit-learn and the model modules
+        context = multiprocessing.get_context('spawn')
+        n_threads = max(1, (os.cpu_count() or 1) // n_workers)
+        with ProcessPoolExecutor(max_workers=n_workers, mp_context=context, initializer=_limit_threads,
+                                 initargs=(n_threads,)) as pool:
+            histories = list(pool.map(_run_task, tasks))
+    else:
+        histories = [_run_task(task) for task in tasks]
+    
+    rows = []
+    for c, params in enumerate(candidates):
+        fold_histories = [dict(history) for history in histories[c * n_folds:(c + 1) * n_folds]]
+        # Only checkpoints every fold reached are comparable
+        for max_iter in checkpoints:
+            scores = [history[max_iter] for history in fold_histories if max_iter in history]
+            if len(scores) < n_folds:
+                break
+            rows.append(dict(params, max_iter=max_iter, mean=float(np.mean(scores)), std=float(np.std(scores))))
+    results = pd.DataFrame(rows).sort_values(['mean', 'max_iter'], ascending=[False, True], ignore_index=True)
+    best = results.iloc[0]
+    best_params = {key: _plain(best[key]) for key in list(space) + ['max_iter']}
+    best_params.update(early_stopping=False, random_state=seed)
+    return best_params, results
+
+
+def _plain(value):
+    """numpy scalars as JSON-friendly Python values"""
+    return value.item() if hasattr(value, 'item') else value
+
+
+def save_tuned_params(params, metric, path=TUNED_PARAMS_PATH, **details):
+    """Persist the winning configuration atomically"""
+    from ingest import atomic_path
+    
+    payload = dict(details, params=params, metric=TUNING_METRIC, score=metric,
+                   tuned_at=time.strftime('%Y-%m-%dT%H:%M:%S'))
+    with atomic_path(path) as tmp_path, open(tmp_path, 'w') as out:
+        json.dump(payload, out, indent=1)
+    return path
+
+
+def load_tuned_params(path=TUNED_PARAMS_PATH):
+    """Tuned model parameters, or None when no search has been persisted (or the file is unreadable)"""
+    try:
+        with open(path) as f:
+            return json.load(f)['params']
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def main():
+    from uplift_core import calculate_customer_segments, load_data
+    
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('path', nargs='?', default=DATA_PATH)
+    parser.add_argument('--folds', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--learners', nargs='+', default=SEARCH_SPACE['learner'], choices=['s', 't', 'x'])
+    parser.add_argument('--max-rows', type=int, default=None, help='tune on a random sample of at most this many rows')
+    parser.add_argument('--output', default=TUNED_PARAMS_PATH)
+    args = parser.parse_args()
+    
+    df = calculate_customer_segments(load_data(args.path))
+    if args.max_rows and len(df) > args.max_rows:
+        df = df.sample(args.max_rows, random_state=42)
+    start = time.perf_counter()
+    best_params, results = tune(df, dict(SEARCH_SPACE, learner=args.learners), args.folds, args.workers)
+    elapsed = time.perf_counter() - start
+    print(results.head(10).round(5).to_string(index=False))
+    save_tuned_params(best_params, float(results['mean'].iloc[0]), args.output, rows=len(df), folds=args.folds,
+                      seconds=round(elapsed, 1))
+    print(f"best {best_params} in {elapsed:.1f}s; saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
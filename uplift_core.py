@@ -0,0 +1,97 @@
+"""Analytics core of the dashboard: loading, segmentation, uplift maths and modelling
+
+Importable without Streamlit or plotting libraries. scikit-learn and joblib
+are only imported when a model is actually fitted or loaded.
+"""
+import os
+
+import pandas as pd
+
+from config import DATA_PATH
+from ingest import read_promo_data, source_files
+from segmentation import add_demographic_segments, assign_segments
+
+# Hyperparameters for the uplift model; part of the model registry key
+# ('t' = two-model T-learner; 's' and 'x' select the S- and X-learner)
+UPLIFT_MODEL_PARAMS = {'learner': 't', 'max_iter': 100, 'learning_rate': 0.1, 'random_state': 42}
+
+
+def source_signature(path=DATA_PATH):
+    """Cheap identity of the source file used to invalidate caches when it changes"""
+    if os.path.isdir(path):
+        # A drop directory changes when any CSV in it is added, removed or rewritten
+        stats = [(os.path.basename(source), os.stat(source)) for source in source_files(path)]
+        return (path,) + tuple((name, stat.st_mtime_ns, stat.st_size) for name, stat in stats)
+    stat = os.stat(path)
+    return (path, stat.st_mtime_ns, stat.st_size)
+
+
+def load_data(path=DATA_PATH):
+    """Load and preprocess the promotional uplift dataset"""
+    df = read_promo_data(path)
+    
+    # Create additional features for analysis (income and age bins)
+    add_demographic_segments(df)
+    
+    return df
+
+
+def calculate_customer_segments(df):
+    """Calculate customer segments based on behavior and demographics"""
+    # Create customer segments based on total spent and customer status
+    # (rules live in segmentation.SEGMENT_RULES and are evaluated column-wise).
+    # Returns a new frame: the input may be a cached or shared snapshot and is never modified.
+    return df.assign(customer_segment=assign_segments(df))
+
+
+def calculate_uplift_metrics(segment_stats):
+    """Calculate uplift metrics for promotional campaigns"""
+    # Response rates by segment and promo exposure, from the cube's summed measures
+    uplift_analysis = pd.DataFrame({
+        'customer_segment': segment_stats['customer_segment'],
+        'promo_exposed': segment_stats['promo_exposed'],
+        'response_rate': (segment_stats['purchase_sum'] / segment_stats['count']).round(4),
+        'transaction_count': segment_stats['count'],
+        'avg_basket_size': (segment_stats['basket_sum'] / segment_stats['count']).round(4)
+    })
+    
+    # Calculate uplift
+    # (both exposure columns are kept even if a filtered subset lacks one group)
+    uplift_pivot = uplift_analysis.pivot(index='customer_segment',
+                                       columns='promo_exposed',
+                                       values='response_rate').reindex(columns=[0, 1]).reset_index()
+    
+    uplift_pivot.columns = ['customer_segment', 'control_rate', 'treatment_rate']
+    uplift_pivot['uplift'] = uplift_pivot['treatment_rate'] - uplift_pivot['control_rate']
+    control_rate = uplift_pivot['control_rate'].where(uplift_pivot['control_rate'] > 0)
+    uplift_pivot['uplift_percentage'] = (uplift_pivot['uplift'] / control_rate * 100).round(2)
+    
+    return uplift_analysis, uplift_pivot
+
+
+def model_params():
+    """Tuned model parameters when a search has been persisted, else the defaults"""
+    from tuning import load_tuned_params
+    return load_tuned_params() or UPLIFT_MODEL_PARAMS
+
+
+def create_uplift_model(df, params=UPLIFT_MODEL_PARAMS):
+    """Fit a gradient-boosted S-, T- or X-learner uplift model (T-learner by default)"""
+    from uplift_models import UpliftModel
+    
+    # Gradient boosted meta-learner scoring per-customer uplift (see uplift_models.py)
+    model = UpliftModel(**params).fit(df)
+    
+    return model, model.features
+
+
+def load_or_fit_uplift_model(df, params=None):
+    """Return (model, features) from the on-disk registry, fitting only on a miss"""
+    from model_registry import load_or_fit
+    from uplift_models import CATEGORICAL_FEATURES, NUMERIC_FEATURES, OUTCOME, TREATMENT
+    
+    params = model_params() if params is None else params
+    # The registry key is a fingerprint of the training columns and hyperparameters,
+    # so a cold process loads instead of fitting
+    training_columns = NUMERIC_FEATURES + CATEGORICAL_FEATURES + [TREATMENT, OUTCOME]
+    return load_or_fit(df, training_columns, params, lambda: create_uplift_model(df, params))
@@ -0,0 +1,192 @@
+"""Qini curve, AUUC and uplift-by-decile evaluation of uplift scores
+
+Every metric comes from one descending sort of the scores followed by
+cumulative sums of the treated / control counts and purchases, so a full
+evaluation is O(n log n) and runs in seconds on tens of millions of rows.
+Tied scores are only evaluated at the end of each tie, so the curves do not
+depend on the order of equal scores (decile edges may split a tie).
+
+Usage: python uplift_evaluation.py [PATH] [--folds 5] [--learners t x] [--max-train-rows 200000]
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from uplift_models import LEARNERS, OUTCOME, TREATMENT
+
+# Points kept in the returned curves (metrics use every tie boundary)
+CURVE_POINTS = 101
+
+
+def _area(x, y):
+    """Trapezoidal area under y(x)"""
+    return float(np.sum((y[1:] + y[:-1]) * np.diff(x)) / 2)
+
+
+class UpliftEvaluation:
+    """Curves, decile table and summary metrics for one set of scores"""
+    
+    def __init__(self, curve, deciles, summary):
+        self.curve = curve
+        self.deciles = deciles
+        self.summary = summary
+    
+    def as_dict(self):
+        return dict(self.summary)
+
+
+def evaluate_uplift(scores, treatment, outcome, n_bins=10, n_points=CURVE_POINTS):
+    """Qini and uplift curves, AUUC, Qini coefficient and uplift by score decile
+    
+    ``curve`` holds, per fraction of customers targeted (highest scores
+    first), the incremental purchases of the Qini curve, the random-targeting
+    baseline and the cumulative uplift curve. ``summary`` areas are per
+    customer, so they compare across sample sizes: ``qini_coefficient`` is the
+    area between the Qini curve and the random line and ``auuc`` the area
+    under the uplift curve.
+    """
+    scores = np.asarray(scores)
+    n_rows = len(scores)
+    if n_rows == 0:
+        raise ValueError("Cannot evaluate an empty set of scores")
+    # Introsort is several times faster than a stable sort here; ties are handled below
+    order = np.argsort(-scores)
+    treated = np.asarray(treatment)[order].astype(bool)
+    purchased = np.asarray(outcome)[order].astype(bool)
+    
+    n_treated = np.cumsum(treated, dtype=np.int64)
+    y_treated = np.cumsum(purchased & treated, dtype=np.int64)
+    y_control = np.cumsum(purchased & ~treated, dtype=np.int64)
+    
+    # Evaluate at the last row of every run of equal scores, plus the origin
+    sorted_scores = scores[order]
+    ends = np.append(np.flatnonzero(sorted_scores[1:] != sorted_scores[:-1]), n_rows - 1)
+    k = ends + 1
+    n_t, y_t, y_c = n_treated[ends], y_treated[ends], y_control[ends]
+    n_c = k - n_t
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Qini: treated purchases minus control purchases scaled to the treated group size
+        qini = y_t - np.where(n_c > 0, y_c * n_t / n_c, 0.0)
+        # Uplift curve: difference in response rates times the number targeted
+        uplift = np.where((n_t > 0) & (n_c > 0), y_t / n_t - y_c / n_c, 0.0) * k
+    fraction = np.concatenate([[0.0], k / n_rows])
+    qini = np.concatenate([[0.0], qini])
+    uplift = np.concatenate([[0.0], uplift])
+    random = qini[-1] * fraction
+    
+    grid = np.linspace(0, 1, n_points)
+    curve = pd.DataFrame({
+        'fraction_targeted': grid,
+        'customers_targeted': np.round(grid * n_rows).astype(np.int64),
+        'qini': np.interp(grid, fraction, qini),
+        'random': qini[-1] * grid,
+        'uplift_curve': np.interp(grid, fraction, uplift),
+    })
+    
+    # Deciles by rank: cumulative sums at the bin edges give each bin's totals
+    n_bins = min(n_bins, n_rows)
+    edges = (np.arange(n_bins + 1) * n_rows) // n_bins
+    
+    def at(values):
+        return np.diff(np.concatenate([[0], values[edges[1:] - 1]]))
+    
+    bin_rows = np.diff(edges)
+    bin_treated = at(n_treated)
+    bin_control = bin_rows - bin_treated
+    score_sum = at(np.cumsum(sorted_scores, dtype=np.float64))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        treatment_rate = at(y_treated) / bin_treated
+        control_rate = at(y_control) / bin_control
+        deciles = pd.DataFrame({
+            'decile': np.arange(1, n_bins + 1),
+            'customers': bin_rows,
+            'treated': bin_treated,
+            'control': bin_control,
+            'mean_score': score_sum / bin_rows,
+            'treatment_rate': treatment_rate,
+            'control_rate': control_rate,
+            'uplift': treatment_rate - control_rate,
+        })
+    
+    summary = {
+        'rows': n_rows,
+        'overall_uplift': float(uplift[-1] / n_rows),
+        'incremental_purchases': float(qini[-1]),
+        'qini_coefficient': _area(fraction, (qini - random) / n_rows),
+        'auuc': _area(fraction, uplift / n_rows),
+        'random_auuc': float(uplift[-1] / n_rows / 2),
+    }
+    return UpliftEvaluation(curve, deciles, summary)
+
+
+def split_folds(n_rows, n_folds, seed=42):
+    """Shuffled row positions split into ``n_folds`` near-equal folds"""
+    return np.array_split(np.random.default_rng(seed).permutation(n_rows), n_folds)
+
+
+def _fit_and_score(df, train, test, params, max_train_rows, seed):
+    from uplift_models import UpliftModel
+    if max_train_rows and len(train) > max_train_rows:
+        train = np.random.default_rng(seed).choice(train, max_train_rows, replace=False)
+    model = UpliftModel(**params).fit(df.iloc[np.sort(train)])
+    return model.predict_uplift(df.iloc[test])
+
+
+def holdout_evaluation(df, params, test_fraction=0.3, seed=42, max_train_rows=None, n_bins=10):
+    """Fit on a random training split and evaluate on the held-out rows"""
+    positions = np.random.default_rng(seed).permutation(len(df))
+    n_test = max(1, int(round(len(df) * test_fraction)))
+    test, train = np.sort(positions[:n_test]), positions[n_test:]
+    scores = _fit_and_score(df, train, test, params, max_train_rows, seed)
+    return evaluate_uplift(scores, df[TREATMENT].to_numpy()[test], df[OUTCOME].to_numpy()[test], n_bins)
+
+
+def kfold_evaluation(df, params, n_folds=5, seed=42, max_train_rows=None, n_bins=10):
+    """Out-of-fold scores for every row, evaluated pooled and per fold
+    
+    Returns the pooled ``UpliftEvaluation`` and a frame of per-fold summaries.
+    """
+    folds = split_folds(len(df), n_folds, seed)
+    treatment, outcome = df[TREATMENT].to_numpy(), df[OUTCOME].to_numpy()
+    scores = np.empty(len(df), dtype=np.float32)
+    per_fold = []
+    for i, test in enumerate(folds):
+        test = np.sort(test)
+        train = np.concatenate([fold for j, fold in enumerate(folds) if j != i])
+        scores[test] = _fit_and_score(df, train, test, params, max_train_rows, seed)
+        per_fold.append(dict(fold=i + 1, **evaluate_uplift(scores[test], treatment[test], outcome[test],
+                                                           n_bins).summary))
+    return evaluate_uplift(scores, treatment, outcome, n_bins), pd.DataFrame(per_fold)
+
+
+def main():
+    from uplift_core import UPLIFT_MODEL_PARAMS, calculate_customer_segments, load_data
+    from config import DATA_PATH
+    
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('path', nargs='?', default=DATA_PATH)
+    parser.add_argument('--folds', type=int, default=5, help='k for k-fold evaluation (1 runs a 70/30 holdout)')
+    parser.add_argument('--learners', nargs='+', default=[UPLIFT_MODEL_PARAMS['learner']], choices=LEARNERS)
+    parser.add_argument('--max-train-rows', type=int, default=None)
+    args = parser.parse_args()
+    
+    df = calculate_customer_segments(load_data(args.path))
+    for learner in args.learners:
+        params = dict(UPLIFT_MODEL_PARAMS, learner=learner)
+        start = time.perf_counter()
+        if args.folds > 1:
+            evaluation, per_fold = kfold_evaluation(df, params, args.folds, max_train_rows=args.max_train_rows)
+        else:
+            evaluation, per_fold = holdout_evaluation(df, params, max_train_rows=args.max_train_rows), None
+        print(f"{learner}-learner ({time.perf_counter() - start:.1f}s)")
+        for key, value in evaluation.as_dict().items():
+            print(f"{key:>22}: {value:.6g}")
+        if per_fold is not None:
+            print(per_fold.round(4).to_string(index=False))
+        print(evaluation.deciles.round(4).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""Meta-learner uplift models (S-, T- and X-learner) on histogram gradient boosting"""
+import numpy as np
+
+# The feature lists are re-exported for callers that key models on the training columns
+from feature_pipeline import CATEGORICAL_FEATURES, NUMERIC_FEATURES, FeaturePipeline
+
+TREATMENT = 'promo_exposed'
+OUTCOME = 'purchase_made'
+LEARNERS = ('s', 't', 'x')
+
+
+class UpliftModel:
+    """Estimate per-customer uplift (CATE) of promo exposure on purchase probability
+
+    ``learner`` selects the meta-learner:
+      * ``'s'`` - one classifier with treatment as a feature, scored with it on and off
+      * ``'t'`` - separate classifiers for treated and control customers
+      * ``'x'`` - T-learner outcomes, imputed effects regressed per group and
+        blended with the propensity score (Kunzel et al., 2019)
+    Remaining keyword arguments are passed to the gradient boosting estimators.
+    """
+    
+    def __init__(self, learner='t', **params):
+        if learner not in LEARNERS:
+            raise ValueError(f"Unknown learner {learner!r}; expected one of {LEARNERS}")
+        self.learner = learner
+        self.params = params
+        # Encoders are fitted with the model and persisted alongside it
+        self.pipeline_ = FeaturePipeline()
+        self.models_ = {}
+    
+    @property
+    def features(self):
+        return self.pipeline_.feature_names
+    
+    def _categorical_mask(self, with_treatment=False):
+        mask = self.pipeline_.categorical_mask
+        return mask + [False] if with_treatment else mask
+    
+    def _classifier(self, with_treatment=False):
+        from sklearn.ensemble import HistGradientBoostingClassifier
+        return HistGradientBoostingClassifier(
+            categorical_features=self._categorical_mask(with_treatment), **self.params)
+    
+    def _regressor(self):
+        from sklearn.ensemble import HistGradientBoostingRegressor
+        return HistGradientBoostingRegressor(categorical_features=self._categorical_mask(), **self.params)
+    
+    def _fit_estimator(self, name, make, X, y, warm=True):
+        """Fit one estimator; with ``warm_start`` an existing one keeps its trees and adds to them"""
+        estimator = self.models_.get(name) if warm and self.params.get('warm_start') else None
+        if estimator is None:
+            estimator = make()
+        else:
+            estimator.set_params(max_iter=self.params.get('max_iter', 100))
+        self.models_[name] = estimator.fit(X, y)
+        return self.models_[name]
+    
+    def fit(self, df, treatment=TREATMENT, outcome=OUTCOME):
+        """Fit the meta-learner on row-level data"""
+        X = self.pipeline_.fit_transform(df)
+        t = df[treatment].to_numpy().astype(bool)
+        y = df[outcome].to_numpy().astype(np.int8)
+        return self.fit_encoded(X, t, y)
+    
+    def fit_encoded(self, X, t, y):
+        """Fit on an already encoded feature matrix (``pipeline_.transform`` layout)
+        
+        With ``warm_start=True`` in the estimator parameters, calling this again
+        after raising ``params['max_iter']`` continues boosting from the
+        current trees instead of starting over.
+        """
+        t = np.asarray(t).astype(bool)
+        y = np.asarray(y).astype(np.int8)
+        if self.learner == 's':
+            self._fit_estimator('s', lambda: self._classifier(True), np.column_stack([X, t]), y)
+            return self
+        
+        self._fit_estimator('control', self._classifier, X[~t], y[~t])
+        self._fit_estimator('treated', self._classifier, X[t], y[t])
+        if self.learner == 'x':
+            # Imputed individual effects, each estimated with the other group's outcome model
+            effect_treated = y[t] - self.models_['control'].predict_proba(X[t])[:, 1]
+            effect_control = self.models_['treated'].predict_proba(X[~t])[:, 1] - y[~t]
+            # Their targets move as the outcome models grow, so these are refitted rather than continued
+            self._fit_estimator('tau_treated', self._regressor, X[t], effect_treated, warm=False)
+            self._fit_estimator('tau_control', self._regressor, X[~t], effect_control, warm=False)
+            self._fit_estimator('propensity', self._classifier, X, t)
+        return self
+    
+    def predict_uplift(self, df):
+        """Vectorized CATE scores, one per row of ``df``"""
+        return self.predict_encoded(self.pipeline_.transform(df))
+    
+    def predict_encoded(self, X):
+        """CATE scores for an already encoded feature matrix"""
+        if self.learner == 's':
+            # Score every row with treatment on and off in one batch
+            n_rows = len(X)
+            stacked = np.vstack([np.column_stack([X, np.ones(n_rows)]), np.column_stack([X, np.zeros(n_rows)])])
+            proba = self.models_['s'].predict_proba(stacked)[:, 1]
+            return (proba[:n_rows] - proba[n_rows:]).astype(np.float32)
+        if self.learner == 't':
+            return (self.models_['treated'].predict_proba(X)[:, 1]
+                    - self.models_['control'].predict_proba(X)[:, 1]).astype(np.float32)
+        propensity = self.models_['propensity'].predict_proba(X)[:, 1]
+        return (propensity * self.models_['tau_control'].predict(X)
+                + (1 - propensity) * self.models_['tau_treated'].predict(X)).astype(np.float32)
+    
+    def save(self, path):
+        import joblib
+        joblib.dump(self, path)
+    
+    @staticmethod
+    def load(path):
+        import joblib
+        return joblib.load(path)